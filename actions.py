@@ -1,6 +1,6 @@
+import collections
 import entities
 import worldmodel
-import pygame
 import math
 import random
 import point
@@ -22,6 +22,13 @@ VEIN_RATE_MIN = 8000
 VEIN_RATE_MAX = 17000
 
 
+# A scheduled step: what to do (a key of entities.ACTION_HANDLERS), to
+# which entity (by world id), when, and any extra handler arguments.
+# Records compare and hash by value, so equal records are interchangeable
+# in the queue and in pending lists, and they pickle as plain data.
+Action = collections.namedtuple('Action', 'kind entity_id time args')
+
+
 def sign(x):
    if x < 0:
       return -1
@@ -31,7 +38,17 @@ def sign(x):
       return 0
 
 ###
-def next_position(world, entity_pt, dest_pt):
+def next_position(world, entity_pt, dest_pt, target_type=None):
+   if target_type and world.distance_fields:
+      new_pt = world.distance_fields.next_step(entity_pt, target_type)
+      if new_pt:
+         return new_pt
+
+   if world.pathfinder:
+      new_pt = world.pathfinder.next_step(entity_pt, dest_pt)
+      if new_pt and not world.is_occupied(new_pt):
+         return new_pt
+
    horiz = sign(dest_pt.x - entity_pt.x)
    new_pt = point.Point(entity_pt.x + horiz, entity_pt.y)
 
@@ -46,6 +63,12 @@ def next_position(world, entity_pt, dest_pt):
 
 ###
 def blob_next_position(world, entity_pt, dest_pt):
+   if world.pathfinder:
+      new_pt = world.pathfinder.next_step(entity_pt, dest_pt)
+      if new_pt and (not world.is_occupied(new_pt) or
+         isinstance(world.get_tile_occupant(new_pt), entities.Ore)):
+         return new_pt
+
    horiz = sign(dest_pt.x - entity_pt.x)
    new_pt = point.Point(entity_pt.x + horiz, entity_pt.y)
 
@@ -64,15 +87,7 @@ def blob_next_position(world, entity_pt, dest_pt):
 
 ###
 def find_open_around(world, pt, distance):
-   for dy in range(-distance, distance + 1):
-      for dx in range(-distance, distance + 1):
-         new_pt = point.Point(pt.x + dx, pt.y + dy)
-
-         if (world.within_bounds(new_pt) and
-            (not world.is_occupied(new_pt))):
-            return new_pt
-
-   return None
+   return world.find_open_around(pt, distance)
 
 
 def create_blob(world, name, pt, rate, ticks, i_store):
@@ -85,13 +100,13 @@ def create_blob(world, name, pt, rate, ticks, i_store):
 
 
 def schedule_blob(world, blob, ticks, i_store):
-   schedule_action(world, blob, blob.create_ore_blob_action(world, i_store),
+   schedule_action(world, blob, entities.ORE_BLOB_ACTION,
       ticks + blob.get_rate())
    schedule_animation(world, blob)
 
 
 def schedule_miner(world, miner, ticks, i_store):
-   schedule_action(world, miner, miner.create_miner_action(world, i_store),
+   schedule_action(world, miner, miner.miner_action_kind,
       ticks + miner.get_rate())
    schedule_animation(world, miner)
 
@@ -105,8 +120,7 @@ def create_ore(world, name, pt, ticks, i_store):
 
 
 def schedule_ore(world, ore, ticks, i_store):
-   schedule_action(world, ore,
-      ore.create_ore_transform_action(world, i_store),
+   schedule_action(world, ore, entities.ORE_TRANSFORM_ACTION,
       ticks + ore.get_rate())
 
 
@@ -119,7 +133,7 @@ def create_quake(world, pt, ticks, i_store):
 
 def schedule_quake(world, quake, ticks):
    schedule_animation(world, quake, QUAKE_STEPS) 
-   schedule_action(world, quake, quake.create_entity_death_action(world),
+   schedule_action(world, quake, entities.ENTITY_DEATH_ACTION,
       ticks + QUAKE_DURATION)
 
 
@@ -131,19 +145,44 @@ def create_vein(world, name, pt, ticks, i_store):
 
 
 def schedule_vein(world, vein, ticks, i_store):
-   schedule_action(world, vein, vein.create_vein_action(world, i_store),
+   schedule_action(world, vein, entities.VEIN_ACTION,
       ticks + vein.get_rate())
 
 
-def schedule_action(world, entity, action, time):
+def schedule_action(world, entity, kind, time, args=()):
+   entity_id = entity.id
+   if entity_id is None:
+      entity_id = world.register_entity(entity)
+   action = Action(kind, entity_id, time, args)
    entity.add_pending_action(action)
    world.schedule_action(action, time)
+   return action
+
+
+# Schedules a mover's next action, which takes several steps at once when
+# the world's level of detail says the mover is far from the view.  Such an
+# action is placed at the time of the last step it covers, so no step is
+# ever taken before its own time; move_start gives back the time its first
+# step stands for.
+def schedule_move(world, entity, kind, time):
+   args = ()
+   if world.lod:
+      steps = world.lod.steps_for(entity)
+      if steps > 1:
+         args = (steps,)
+         time += entity.get_rate() * (steps - 1)
+      elif world.lod.is_near(entity.get_position()):
+         world.lod.resume_animation(entity, time)
+   return schedule_action(world, entity, kind, time, args)
+
+
+def move_start(entity, ticks, steps):
+   return ticks - entity.get_rate() * (steps - 1)
 
 
 def schedule_animation(world, entity, repeat_count=0):
-   schedule_action(world, entity,
-      entity.create_animation_action(world, repeat_count),
-      entity.get_animation_rate())
+   schedule_action(world, entity, entities.ANIMATION_ACTION,
+      entity.get_animation_rate(), (repeat_count,))
 
 
 def clear_pending_actions(world, entity):
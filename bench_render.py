@@ -0,0 +1,122 @@
+import argparse
+import entities
+import image_store
+import os
+import point
+import random
+import statistics
+import time
+import worldmodel
+
+IMAGE_LIST_FILE_NAME = 'imagelist'
+
+SCREEN_WIDTH = 640
+SCREEN_HEIGHT = 480
+TILE_WIDTH = 32
+TILE_HEIGHT = 32
+
+DEFAULT_FRAMES = 50
+OCCUPIED_FRACTION = 0.3
+OCCUPANT_IMAGES = ['obstacle', 'blacksmith', 'vein', 'ore', 'miner', 'blob',
+   'quake']
+BACKGROUND_IMAGES = ['grass', 'rocks']
+
+
+def create_world(i_store, num_cols, num_rows, seed=1):
+   rng = random.Random(seed)
+   backgrounds = [entities.Background(name,
+      image_store.get_images(i_store, name)) for name in BACKGROUND_IMAGES]
+   world = worldmodel.WorldModel(num_rows, num_cols, backgrounds[0])
+   for y in range(0, num_rows):
+      for x in range(0, num_cols):
+         pt = point.Point(x, y)
+         world.set_background(pt, rng.choice(backgrounds))
+         if rng.random() < OCCUPIED_FRACTION:
+            name = rng.choice(OCCUPANT_IMAGES)
+            world.add_entity(entities.Obstacle(name, pt,
+               image_store.get_images(i_store, name)))
+   return world
+
+
+def full_redraw(view):
+   view.draw_viewport()
+
+
+def cold_redraw(view):
+   for cache in view.chunks:
+      cache.clear()
+   view.draw_viewport()
+
+
+def all_tiles(view):
+   view.mark_tiles([point.Point(x, y)
+      for y in range(view.viewport.top, view.viewport.bottom)
+      for x in range(view.viewport.left, view.viewport.right)])
+   view.flush()
+
+
+CASES = [('full redraw', full_redraw),
+         ('cold redraw', cold_redraw),
+         ('all tiles dirty', all_tiles)]
+
+
+def time_frames(view, draw, frames):
+   draw(view)
+   times = []
+   for frame in range(0, frames):
+      start = time.perf_counter()
+      draw(view)
+      times.append(time.perf_counter() - start)
+   return times
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Time full-screen redraws at each zoom level.')
+   parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES)
+   parser.add_argument('--single', action='store_true',
+      help='issue one blit per sequence item instead of Surface.blits')
+   args = parser.parse_args()
+
+   os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+   import pygame
+   import worldview
+
+   # the screen is drawn through this subclass so --single can replace
+   # blits with the per-item loop the views used to run
+   class Screen(pygame.Surface):
+      def blits(self, blit_sequence, doreturn=1):
+         if args.single:
+            for (source, dest) in blit_sequence:
+               self.blit(source, dest)
+         else:
+            return pygame.Surface.blits(self, blit_sequence, doreturn)
+
+   pygame.init()
+   pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+   screen = Screen((SCREEN_WIDTH, SCREEN_HEIGHT))
+   i_store = image_store.load_images(IMAGE_LIST_FILE_NAME,
+      TILE_WIDTH, TILE_HEIGHT)
+   mipmaps = image_store.build_mipmaps(i_store, worldview.MAX_ZOOM)
+   view_cols = SCREEN_WIDTH // TILE_WIDTH
+   view_rows = SCREEN_HEIGHT // TILE_HEIGHT
+   world = create_world(i_store, view_cols << worldview.MAX_ZOOM,
+      view_rows << worldview.MAX_ZOOM)
+   view = worldview.WorldView(view_cols, view_rows, screen, world,
+      TILE_WIDTH, TILE_HEIGHT, mipmaps=mipmaps)
+
+   print('%-16s %6s %7s %10s %10s' % ('case', 'tile', 'tiles', 'median ms',
+      'min ms'))
+   for zoom in range(0, worldview.MAX_ZOOM + 1):
+      view.set_zoom(zoom)
+      for (name, draw) in CASES:
+         times = [elapsed * 1000 for elapsed in
+            time_frames(view, draw, args.frames)]
+         print('%-16s %6s %7d %10.2f %10.2f' % (name,
+            '%dx%d' % (view.zoom_tile_width, view.zoom_tile_height),
+            view.viewport.width * view.viewport.height,
+            statistics.median(times), min(times)))
+
+
+if __name__ == '__main__':
+   main()
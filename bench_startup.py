@@ -0,0 +1,77 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_RUNS = 5
+
+CORE_MODULES = ['worldmodel', 'entities', 'actions', 'occ_grid',
+   'ordered_list', 'save_load']
+
+# Each case runs in a fresh interpreter and prints its elapsed seconds and
+# whether pygame ended up loaded.  The startup cases stop right where the
+# activity loop would take over.
+IMPORT_TEMPLATE = '''
+import sys, time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+STARTUP_TEMPLATE = '''
+import sys, time
+start = time.perf_counter()
+import %(entry)s, %(loop_module)s
+%(loop_module)s.activity_loop = lambda *args: None
+sys.argv = [sys.argv[0]]
+%(entry)s.main()
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+HEADLESS_TEMPLATE = '''
+import sys, time
+start = time.perf_counter()
+import headless
+headless.create_world(headless.WORLD_FILE)
+print(time.perf_counter() - start, 'pygame' in sys.modules)
+'''
+
+CASES = [('import core', IMPORT_TEMPLATE % ', '.join(CORE_MODULES)),
+         ('import main', IMPORT_TEMPLATE % 'main'),
+         ('import builder', IMPORT_TEMPLATE % 'builder'),
+         ('headless load', HEADLESS_TEMPLATE),
+         ('main.py startup', STARTUP_TEMPLATE %
+            {'entry': 'main', 'loop_module': 'controller'}),
+         ('builder.py startup', STARTUP_TEMPLATE %
+            {'entry': 'builder', 'loop_module': 'builder_controller'})
+         ]
+
+
+def run_case(code):
+   env = dict(os.environ)
+   env.setdefault('SDL_VIDEODRIVER', 'dummy')
+   env.setdefault('SDL_AUDIODRIVER', 'dummy')
+   env['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+   output = subprocess.check_output([sys.executable, '-c', code],
+      cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+   (elapsed, pygame_loaded) = output.split()[-2:]
+   return (float(elapsed), pygame_loaded == b'True')
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Measure import and startup time in fresh interpreters.')
+   parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+   args = parser.parse_args()
+
+   print('%-20s %10s %10s %8s' % ('case', 'median ms', 'min ms', 'pygame'))
+   for (name, code) in CASES:
+      results = [run_case(code) for run in range(0, args.runs)]
+      times = [elapsed * 1000 for (elapsed, loaded) in results]
+      print('%-20s %10.1f %10.1f %8s' % (name, statistics.median(times),
+         min(times), 'yes' if results[0][1] else 'no'))
+
+
+if __name__ == '__main__':
+   main()
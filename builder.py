@@ -1,11 +1,7 @@
-import builder_controller
 import entities
 import image_store
-import pygame
 import random
-import save_load
 import worldmodel
-import worldview
 
 IMAGE_LIST_FILE_NAME = 'imagelist'
 WORLD_FILE = 'gaia.sav'
@@ -24,6 +20,10 @@ def create_default_background(img):
 
 
 def main():
+   import builder_controller
+   import pygame
+   import worldview
+
    random.seed()
    pygame.init()
    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -7,7 +7,6 @@ import pygame
 import random
 import save_load
 import worldview
-import worldmodel
 
 WORLD_FILE_NAME = 'gaia.sav'
 
@@ -104,18 +103,18 @@ def handle_mouse_button(view, world, event, entity_select, i_store):
    tile_view_pt = worldview.viewport_to_world(view.viewport, mouse_pt)
    if event.button == mouse_buttons.LEFT and entity_select:
       if is_background_tile(entity_select):
-         worldmodel.set_background(world, tile_view_pt,
-            entities.Background(entity_select,
+         world.set_background(tile_view_pt,
+            world.get_background_kind(entity_select,
                image_store.get_images(i_store, entity_select)))
          return [tile_view_pt]
       else:
          new_entity = create_new_entity(tile_view_pt, entity_select, i_store)
          if new_entity:
-            worldmodel.remove_entity_at(world, tile_view_pt)
-            worldmodel.add_entity(world, new_entity)
+            world.remove_entity_at(tile_view_pt)
+            world.add_entity(new_entity)
             return [tile_view_pt]
    elif event.button == mouse_buttons.RIGHT:
-      worldmodel.remove_entity_at(world, tile_view_pt)
+      world.remove_entity_at(tile_view_pt)
       return [tile_view_pt]
    return []
 
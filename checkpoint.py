@@ -0,0 +1,169 @@
+import actions
+import entities
+import gc
+import os
+import pickle
+import point
+import random
+import worldmodel
+
+CHECKPOINT_VERSION = 1
+
+
+# A checkpoint is one pickled dict of plain data: the background palette
+# and a bytes object of palette indices per row, every entity's attributes
+# with images replaced by their image store key, the occupancy, the action
+# queue in pop order with times relative to the checkpoint tick, and the
+# random generator state.  Images are looked up again on restore, so
+# checkpoints work with headless and pygame image stores alike.
+def capture(world, ticks):
+   image_keys = world_image_keys(world)
+
+   palette = []
+   palette_index = {}
+   table = bytearray(256)
+   for (index, bgnd) in enumerate(world.background.palette):
+      key = (bgnd.get_name(), image_keys.get(id(bgnd.get_images())))
+      if key not in palette_index:
+         palette_index[key] = len(palette)
+         palette.append(key)
+      table[index] = palette_index[key]
+   rows = [bytes(row).translate(table) for row in world.background.rows]
+
+   entity_index = dict((id(entity), i)
+      for (i, entity) in enumerate(world.entities))
+   entity_states = [entity_state(entity, image_keys, ticks)
+      for entity in world.entities]
+
+   occupants = []
+   for (y, row) in enumerate(world.occupancy.cells):
+      for (x, entity) in enumerate(row):
+         if entity is not None:
+            occupants.append((x, y, entity_index[id(entity)]))
+
+   queue = [relative_action(action, ticks)
+      for (ord, action) in world.action_queue.items()]
+
+   return {'version' : CHECKPOINT_VERSION,
+           'ticks' : ticks,
+           'size' : (world.num_cols, world.num_rows),
+           'palette' : palette,
+           'background' : rows,
+           'entities' : entity_states,
+           'occupants' : occupants,
+           'registered' : sorted(world.entity_ids),
+           'next_entity_id' : world.next_entity_id,
+           'queue' : queue,
+           'random' : random.getstate()
+           }
+
+
+def restore(state, i_store, ticks=None):
+   if state.get('version') != CHECKPOINT_VERSION:
+      raise ValueError('unsupported checkpoint version: ' +
+         str(state.get('version')))
+   if ticks is None:
+      ticks = state['ticks']
+
+   palette = [entities.Background(name, image_list(i_store, key))
+      for (name, key) in state['palette']]
+   (num_cols, num_rows) = state['size']
+   world = worldmodel.WorldModel(num_rows, num_cols, palette[0])
+   table = bytearray(256)
+   for (index, bgnd) in enumerate(palette):
+      table[index] = world.background.intern(bgnd)
+   world.background.rows = [bytearray(bytes(row).translate(table))
+      for row in state['background']]
+   world.i_store = i_store
+
+   records = {}
+   world.entities = [restore_entity(entity, i_store, ticks, records)
+      for entity in state['entities']]
+   for (x, y, index) in state['occupants']:
+      world.occupancy.set_cell(point.Point(x, y), world.entities[index])
+   world.index.rebuild()
+
+   registered = set(state['registered'])
+   for entity in world.entities:
+      if getattr(entity, 'id', None) in registered:
+         world.entity_ids[entity.id] = entity
+   world.next_entity_id = state['next_entity_id']
+
+   # equal ords pop most recently inserted first, so insert in reverse
+   world.action_queue.begin_bulk()
+   for record in reversed(state['queue']):
+      action = absolute_action(record, ticks, records)
+      world.action_queue.insert(action, action.time)
+   world.action_queue.end_bulk()
+
+   random.setstate(state['random'])
+   return (world, ticks)
+
+
+def save_checkpoint(filename, world, ticks):
+   tmp_name = filename + '.tmp'
+   with open(tmp_name, 'wb') as file:
+      pickle.dump(capture(world, ticks), file, pickle.HIGHEST_PROTOCOL)
+   os.replace(tmp_name, filename)
+
+
+# Collection is paused for the same reason as in save_load.load_world_bulk.
+def load_checkpoint(filename, i_store, ticks=None):
+   gc_was_enabled = gc.isenabled()
+   gc.disable()
+   try:
+      with open(filename, 'rb') as file:
+         return restore(pickle.load(file), i_store, ticks)
+   finally:
+      if gc_was_enabled:
+         gc.enable()
+
+
+def world_image_keys(world):
+   keys = {}
+   if world.i_store:
+      for (key, imgs) in world.i_store.items():
+         keys[id(imgs)] = key
+   return keys
+
+
+def image_list(i_store, key):
+   if key is None:
+      return []
+   return i_store.get(key, [])
+
+
+def entity_state(entity, image_keys, ticks):
+   attrs = dict(vars(entity))
+   attrs['imgs'] = image_keys.get(id(entity.get_images()))
+   attrs['position'] = (entity.position.x, entity.position.y)
+   if 'pending_actions' in attrs:
+      attrs['pending_actions'] = [relative_action(action, ticks)
+         for action in entity.pending_actions]
+   return (type(entity).__name__, attrs)
+
+
+def restore_entity(state, i_store, ticks, records):
+   (kind, attrs) = state
+   cls = getattr(entities, kind)
+   entity = cls.__new__(cls)
+   entity.__dict__.update(attrs)
+   entity.imgs = image_list(i_store, attrs['imgs'])
+   entity.position = point.Point(*attrs['position'])
+   if 'pending_actions' in attrs:
+      entity.pending_actions = [absolute_action(record, ticks, records)
+         for record in attrs['pending_actions']]
+   return entity
+
+
+def relative_action(action, ticks):
+   return (action.kind, action.entity_id, action.time - ticks, action.args)
+
+
+def absolute_action(record, ticks, records):
+   action = records.get(record)
+   if action is None:
+      (kind, entity_id, time, args) = record
+      action = actions.Action(kind, entity_id, time + ticks, args)
+      records[record] = action
+   return action
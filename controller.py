@@ -1,4 +1,6 @@
+import keys
 import pygame
+import sim_clock
 import worldview
 import worldmodel
 import point
@@ -23,33 +25,96 @@ def mouse_to_tile(pos, tile_width, tile_height):
    return point.Point(pos[0] // tile_width, pos[1] // tile_height)
 
 
-def handle_timer_event(world, view):
-   rects = world.update_on_time(pygame.time.get_ticks())
-   view.update_view_tiles(rects)
+def handle_timer_event(world, view, clock, elapsed, recorder=None):
+   before = clock.get_ticks()
+   ticks = clock.advance(elapsed)
+   if ticks != before:
+      rects = []
+      if world.lod:
+         rects = world.lod.set_view(view.viewport, before)
+      rects.extend(world.update_on_time(ticks))
+      if recorder:
+         recorder.write_frame(ticks, rects)
+      view.mark_tiles(rects)
 
 
 def handle_mouse_motion(view, event):
-   mouse_pt = mouse_to_tile(event.pos, view.tile_width, view.tile_height)
+   mouse_pt = mouse_to_tile(event.pos, view.zoom_tile_width,
+      view.zoom_tile_height)
    view.mouse_move(mouse_pt)
 
 
-def handle_keydown(view, event):
-   view_delta = on_keydown(event)
-   view.update_view(view_delta)
+def handle_mouse_button(view, event):
+   tile = view.minimap_tile_at(event.pos)
+   if tile:
+      view.center_on(tile)
 
 
-def activity_loop(view, world):
+def handle_keydown(view, event):
+   if event.key == keys.ZOOM_IN_KEY:
+      view.set_zoom(view.zoom - 1)
+   elif event.key == keys.ZOOM_OUT_KEY:
+      view.set_zoom(view.zoom + 1)
+   elif event.key == keys.TRACE_KEY:
+      if view.tracer:
+         print('trace written to ' + view.tracer.flush())
+   else:
+      view_delta = on_keydown(event)
+      view.update_view(view_delta)
+
+
+def handle_input(view, event):
+   if event.type == pygame.MOUSEMOTION:
+      handle_mouse_motion(view, event)
+   elif event.type == pygame.MOUSEBUTTONDOWN:
+      handle_mouse_button(view, event)
+   elif event.type == pygame.KEYDOWN:
+      handle_keydown(view, event)
+
+
+def activity_loop(view, world, server=None, recorder=None):
    pygame.key.set_repeat(KEY_DELAY, KEY_INTERVAL)
    pygame.time.set_timer(pygame.USEREVENT, TIMER_FREQUENCY)
 
+   last_ticks = pygame.time.get_ticks()
+   clock = sim_clock.SimClock(last_ticks, step=TIMER_FREQUENCY)
+
    while 1:
       for event in pygame.event.get():
          if event.type == pygame.QUIT:
             return
          elif event.type == pygame.USEREVENT:
-            handle_timer_event(world, view)
-         elif event.type == pygame.MOUSEMOTION:
-            handle_mouse_motion(view, event)
-         elif event.type == pygame.KEYDOWN:
-            handle_keydown(view, event)
+            if server:
+               server.poll(world, clock)
+            now = pygame.time.get_ticks()
+            handle_timer_event(world, view, clock, now - last_ticks,
+               recorder)
+            last_ticks = now
+         else:
+            handle_input(view, event)
+      view.flush()
+
+
+# The simulation runs on its own thread and this loop only draws and reads
+# input.  It blocks in event.wait rather than polling, so the simulation
+# keeps the interpreter while nothing happens here, and every timer event
+# applies whatever frames the simulation published since the last one.
+def threaded_activity_loop(view, mirror, sim):
+   pygame.key.set_repeat(KEY_DELAY, KEY_INTERVAL)
+   pygame.time.set_timer(pygame.USEREVENT, TIMER_FREQUENCY)
+
+   sim.start()
+   try:
+      while 1:
+         for event in [pygame.event.wait()] + pygame.event.get():
+            if event.type == pygame.QUIT:
+               return
+            elif event.type == pygame.USEREVENT:
+               sim.view_rect = tuple(view.viewport)
+               view.mark_tiles(mirror.apply(sim.take()))
+            else:
+               handle_input(view, event)
+         view.flush()
+   finally:
+      sim.stop()
 
@@ -0,0 +1,150 @@
+import entities
+import events
+import heapq
+import point
+
+UNREACHABLE = float('inf')
+
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+OPEN = 0
+BLOCKED = 1
+TARGET = 2
+
+
+# Walking distance from every cell to the nearest entity of one type,
+# found by a breadth-first search started from all of them at once.  Cells
+# holding a blocker are unreachable (unless they hold a target); miners and
+# blobs do not block.  The grid is stored flat with a border of blocked
+# cells around it, so a cell's neighbours are fixed offsets away.  When a
+# cell changes, only the cells whose distance ran through it are
+# recomputed: they are found by following distances that grow by one step
+# away from the cell, reset, and refilled from the intact cells around them.
+class DistanceField:
+   def __init__(self, world, type):
+      self.world = world
+      self.type = type
+      self.stride = world.num_cols + 2
+      self.offsets = [dx + dy * self.stride for (dx, dy) in STEPS]
+      self.build()
+   def build(self):
+      size = self.stride * (self.world.num_rows + 2)
+      self.kind = bytearray([BLOCKED]) * size
+      self.dist = [UNREACHABLE] * size
+      seeds = []
+      for (y, row) in enumerate(self.world.occupancy.cells):
+         index = self.index_of(0, y)
+         for occupant in row:
+            kind = self.kind[index] = self.classify(occupant)
+            if kind == TARGET:
+               seeds.append((0, index))
+            index += 1
+      self.fill(seeds)
+   def index_of(self, x, y):
+      return (y + 1) * self.stride + x + 1
+   def classify(self, entity):
+      if isinstance(entity, self.type):
+         return TARGET
+      elif is_blocker(entity):
+         return BLOCKED
+      return OPEN
+   def fill(self, seeds):
+      heapq.heapify(seeds)
+      (dist, kind, offsets) = (self.dist, self.kind, self.offsets)
+      (heappop, heappush) = (heapq.heappop, heapq.heappush)
+      while seeds:
+         (d, index) = heappop(seeds)
+         if d >= dist[index]:
+            continue
+         dist[index] = d
+         d += 1
+         for offset in offsets:
+            other = index + offset
+            if d < dist[other] and kind[other] != BLOCKED:
+               heappush(seeds, (d, other))
+   def update(self, pt):
+      index = self.index_of(pt.x, pt.y)
+      (dist, kind, offsets) = (self.dist, self.kind, self.offsets)
+      kind[index] = self.classify(self.world.get_tile_occupant(pt))
+      region = [index]
+      if dist[index] != UNREACHABLE:
+         seen = set(region)
+         for cell in region:
+            d = dist[cell] + 1
+            for offset in offsets:
+               other = cell + offset
+               if dist[other] == d and other not in seen:
+                  seen.add(other)
+                  region.append(other)
+      for cell in region:
+         dist[cell] = UNREACHABLE
+
+      seeds = []
+      (right, left, down, up) = offsets
+      for cell in region:
+         if kind[cell] == TARGET:
+            seeds.append((0, cell))
+         elif kind[cell] == OPEN:
+            best = min(dist[cell + right], dist[cell + left],
+               dist[cell + down], dist[cell + up])
+            if best != UNREACHABLE:
+               seeds.append((best + 1, cell))
+      self.fill(seeds)
+   def distance(self, pt):
+      return self.dist[self.index_of(pt.x, pt.y)]
+
+
+# The fields miners follow, one per target type, built on first use and
+# kept current from the world's entity events.  A step is a look at the
+# four neighbours: the free one closest to a target wins, ties going to
+# the first in STEPS order.
+class DistanceFields:
+   def __init__(self, world):
+      self.world = world
+      self.fields = {}
+      world.events.subscribe(events.EntityAdded, self.entity_added)
+      world.events.subscribe(events.EntityMoved, self.entity_moved)
+      world.events.subscribe(events.EntityRemoved, self.entity_removed)
+   def field(self, type):
+      field = self.fields.get(type)
+      if field is None:
+         field = self.fields[type] = DistanceField(self.world, type)
+      return field
+   def entity_added(self, event):
+      self.changed(event.entity, event.entity.get_position())
+   def entity_moved(self, event):
+      self.changed(event.entity, event.old_pt)
+      self.changed(event.entity, event.new_pt)
+   def entity_removed(self, event):
+      self.changed(event.entity, event.pt)
+   def changed(self, entity, pt):
+      blocker = is_blocker(entity)
+      for field in self.fields.values():
+         if blocker or isinstance(entity, field.type):
+            field.update(pt)
+   def next_step(self, pt, type):
+      field = self.field(type)
+      here = field.distance(pt)
+      best = None
+      for (dx, dy) in STEPS:
+         step = point.Point(pt.x + dx, pt.y + dy)
+         if self.world.within_bounds(step):
+            dist = field.distance(step)
+            if (dist < here and (best is None or dist < best[0]) and
+               not self.world.is_occupied(step)):
+               best = (dist, step)
+      return best[1] if best else None
+   def adjacent_target(self, pt, type):
+      for (dx, dy) in STEPS:
+         occupant = self.world.get_tile_occupant(
+            point.Point(pt.x + dx, pt.y + dy))
+         if isinstance(occupant, type):
+            return occupant
+      return None
+
+
+# what a field routes around; movers and quakes come and go too quickly to
+# be worth repairing for and are stepped around at lookup time instead
+def is_blocker(entity):
+   return isinstance(entity,
+      (entities.Obstacle, entities.Blacksmith, entities.Vein, entities.Ore))
@@ -3,6 +3,17 @@ import point
 
 BLOB_RATE_SCALE = 4
 
+ANIMATION_ACTION = 'animation'
+VEIN_ACTION = 'vein'
+ORE_TRANSFORM_ACTION = 'ore_transform'
+ORE_BLOB_ACTION = 'ore_blob'
+ENTITY_DEATH_ACTION = 'entity_death'
+MINE_ACTION = 'mine'
+DELIVER_ACTION = 'deliver'
+
+# movers whose actions may cover several steps away from the view
+STEPPED_ACTIONS = (MINE_ACTION, DELIVER_ACTION, ORE_BLOB_ACTION)
+
 class Entity(object):
    def __init__(self, name, imgs):
       self.name = name
@@ -18,12 +29,12 @@ class Entity(object):
 
 class Background(Entity):
    def __init__(self, name, imgs):
-   	   super(Background, self).__init__(name, imgs)
+      super(Background, self).__init__(name, imgs)
 
 class On_Board(Entity):
    def __init__(self, name, imgs, position):
-   	   super(On_Board, self).__init__(name, imgs)
-	   self.position = position
+      super(On_Board, self).__init__(name, imgs)
+      self.position = position
 
    def set_position(self, point):
       self.position = point
@@ -37,19 +48,22 @@ class On_Board(Entity):
       return self.name
    def next_image(self):
       self.current_img = (self.current_img + 1) % len(self.imgs)
+   def get_kind(self):
+      return type(self)
 
 class Obstacle(On_Board):
    def __init__(self, name, position, imgs):
       super(Obstacle, self).__init__(name, imgs, position)
 
    def entity_string(self):
-      return ' '.join(['obstacle', entity.name, str(entity.position.x),
-         str(entity.position.y)])
+      return ' '.join(['obstacle', self.name, str(self.position.x),
+         str(self.position.y)])
 
 class Action_Entity(On_Board):
    def __init__(self, name, position, imgs):
-	   super(Action_Entity, self).__init__(name, imgs, position)
-	   self.pending_actions = []
+      super(Action_Entity, self).__init__(name, imgs, position)
+      self.id = None
+      self.pending_actions = []
 
    def remove_pending_action(self, action):
       if hasattr(self, "pending_actions"):
@@ -82,42 +96,24 @@ class Vein(Action_Entity):
    def get_resource_distance(self):
       return self.resource_distance
    def entity_string(self):
-      return ' '.join(['vein', entity.name, str(entity.position.x),
-         str(entity.position.y), str(entity.rate),
-         str(entity.resource_distance)])
-   def create_vein_action(self, world, i_store):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
-         open_pt = actions.find_open_around(world, self.get_position(),
-            self.get_resource_distance())
-         if open_pt:
-            ore = actions.create_ore(world,
-               "ore - " + self.get_name() + " - " + str(current_ticks),
-               open_pt, current_ticks, i_store)
-            world.add_entity(ore)
-            tiles = [open_pt]
-         else:
-            tiles = []
-
-         actions.schedule_action(world, self,
-            self.create_vein_action(world, i_store),
-            current_ticks + self.get_rate())
-         return tiles
-      return action
-   def create_animation_action(self, world, repeat_count):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
-         self.next_image()
-
-         if repeat_count != 1:
-            actions.schedule_action(world, self,
-               self.create_animation_action(world, max(repeat_count - 1, 0)),
-               current_ticks + self.get_animation_rate())
-
-         return [self.get_position()]
-      return action
+      return ' '.join(['vein', self.name, str(self.position.x),
+         str(self.position.y), str(self.rate),
+         str(self.resource_distance)])
+   def vein_action(self, world, current_ticks):
+      open_pt = actions.find_open_around(world, self.get_position(),
+         self.get_resource_distance())
+      if open_pt:
+         ore = actions.create_ore(world,
+            "ore - " + self.get_name() + " - " + str(current_ticks),
+            open_pt, current_ticks, world.i_store)
+         world.add_entity(ore)
+         tiles = [open_pt]
+      else:
+         tiles = []
+
+      actions.schedule_action(world, self, VEIN_ACTION,
+         current_ticks + self.get_rate())
+      return tiles
 
 class Ore(Action_Entity):
    def __init__(self, name, position, imgs, rate=5000):
@@ -128,21 +124,18 @@ class Ore(Action_Entity):
    def get_rate(self):
       return self.rate
    def entity_string(self):
-      return ' '.join(['ore', entity.name, str(entity.position.x),
-         str(entity.position.y), str(entity.rate)])
-   def create_ore_transform_action(self, world, i_store):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-         blob = actions.create_blob(world, self.get_name() + " -- blob",
-            self.get_position(),
-            self.get_rate() // BLOB_RATE_SCALE,
-            current_ticks, i_store)
-
-         self.remove_entity(world)
-         world.add_entity(blob)
-
-         return [blob.get_position()]
-      return action
+      return ' '.join(['ore', self.name, str(self.position.x),
+         str(self.position.y), str(self.rate)])
+   def ore_transform_action(self, world, current_ticks):
+      blob = actions.create_blob(world, self.get_name() + " -- blob",
+         self.get_position(),
+         self.get_rate() // BLOB_RATE_SCALE,
+         current_ticks, world.i_store)
+
+      actions.clear_pending_actions(world, self)
+      world.transform_entity(self, blob)
+
+      return [blob.get_position()]
 
 class Blacksmith(Action_Entity):
    def __init__(self, name, position, imgs, resource_limit, rate,
@@ -164,9 +157,9 @@ class Blacksmith(Action_Entity):
    def get_resource_distance(self):
       return self.resource_distance
    def entity_string(self):
-      return ' '.join(['blacksmith', entity.name, str(entity.position.x),
-         str(entity.position.y), str(entity.resource_limit),
-         str(entity.rate), str(entity.resource_distance)])
+      return ' '.join(['blacksmith', self.name, str(self.position.x),
+         str(self.position.y), str(self.resource_limit),
+         str(self.rate), str(self.resource_distance)])
    
 class Animated_Entities(Action_Entity):
    def __init__(self, name, position, imgs, animation_rate):
@@ -175,6 +168,17 @@ class Animated_Entities(Action_Entity):
 
    def get_animation_rate(self):
        return self.animation_rate
+   def animation_action(self, world, current_ticks, repeat_count):
+      if world.lod and not world.lod.is_near(self.get_position()):
+         return []
+      self.next_image()
+
+      if repeat_count != 1:
+         actions.schedule_action(world, self, ANIMATION_ACTION,
+            current_ticks + self.get_animation_rate(),
+            (max(repeat_count - 1, 0),))
+
+      return [self.get_position()]
 
 class OreBlob(Animated_Entities):
    def __init__(self, name, position, rate, imgs, animation_rate):
@@ -199,39 +203,30 @@ class OreBlob(Animated_Entities):
          if isinstance(old_entity, Ore):
             old_entity.remove_entity(world)
          return (world.move_entity(self, new_pt), False)
-   def create_ore_blob_action(self, world, i_store):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
+   def find_move_target(self, world):
+      return world.find_nearest_vein(self)
+   def ore_blob_action(self, world, current_ticks, steps=1):
+      tiles = []
+      taken = 0
+      while taken < steps:
+         taken += 1
          entity_pt = self.get_position()
-         vein = world.find_nearest(entity_pt, Vein)
-         (tiles, found) = self.blob_to_vein(world, vein)
-
-         next_time = current_ticks + self.get_rate()
-         if found:
-            quake = actions.create_quake(world, tiles[0], current_ticks, i_store)
-            world.add_entity(quake)
-            next_time = current_ticks + self.get_rate() * 2
+         (moved, found) = self.blob_to_vein(world,
+            self.find_move_target(world))
+         tiles.extend(moved)
+         if found or same_position(self.get_position(), entity_pt):
+            break
 
-         actions.schedule_action(world, self,
-            self.create_ore_blob_action(world, i_store),
-            next_time)
+      next_time = current_ticks + self.get_rate()
+      if found:
+         quake = actions.create_quake(world, moved[0], current_ticks,
+            world.i_store)
+         world.add_entity(quake)
+         next_time = current_ticks + self.get_rate() * 2
 
-         return tiles
-      return action
-   def create_animation_action(self, world, repeat_count):
-      def action(current_ticks):
-         self.remove_pending_action(action)
+      actions.schedule_move(world, self, ORE_BLOB_ACTION, next_time)
 
-         self.next_image()
-
-         if repeat_count != 1:
-            actions.schedule_action(world, self,
-               self.create_animation_action(world, max(repeat_count - 1, 0)),
-               current_ticks + self.get_animation_rate())
-
-         return [self.get_position()]
-      return action
+      return tiles
 
 class Quake(Animated_Entities):
    def __init__(self, name, position, imgs, animation_rate):
@@ -239,26 +234,10 @@ class Quake(Animated_Entities):
 
    def entity_string(self):
       return 'unknown'
-   def create_animation_action(self, world, repeat_count):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
-         self.next_image()
-
-         if repeat_count != 1:
-            actions.schedule_action(world, self,
-               self.create_animation_action(world, max(repeat_count - 1, 0)),
-               current_ticks + self.get_animation_rate())
-
-         return [self.get_position()]
-      return action
-   def create_entity_death_action(self, world):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-         pt = self.get_position()
-         self.remove_entity(world)
-         return [pt]
-      return action
+   def entity_death_action(self, world, current_ticks):
+      pt = self.get_position()
+      self.remove_entity(world)
+      return [pt]
 
 
 class Miner(Animated_Entities):
@@ -280,34 +259,24 @@ class Miner(Animated_Entities):
       new_entity = transform(world)
       if self != new_entity:
          actions.clear_pending_actions(world, self)
-         world.remove_entity_at(self.get_position())
-         world.add_entity(new_entity)
+         world.transform_entity(self, new_entity)
          actions.schedule_animation(world, new_entity)
       return new_entity
-   def create_animation_action(self, world, repeat_count):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
-         self.next_image()
-
-         if repeat_count != 1:
-            actions.schedule_action(world, self,
-               self.create_animation_action(world, max(repeat_count - 1, 0)),
-               current_ticks + self.get_animation_rate())
-
-         return [self.get_position()]
-      return action
 
 class MinerNotFull(Miner):
+   miner_action_kind = MINE_ACTION
+
    def __init__(self, name, resource_limit, position, rate, imgs, animation_rate):
       super(MinerNotFull, self).__init__(name, resource_limit, position, rate, imgs,
          animation_rate)
       self.resource_count = 0
 
    def entity_string(self):
-      return ' '.join(['miner', entity.name, str(entity.position.x),
-         str(entity.position.y), str(entity.resource_limit),
-         str(entity.rate), str(entity.animation_rate)])
+      return ' '.join(['miner', self.name, str(self.position.x),
+         str(self.position.y), str(self.resource_limit),
+         str(self.rate), str(self.animation_rate)])
+   def find_move_target(self, world):
+      return world.find_target(self.get_position(), Ore)
    def miner_to_ore(self, world, ore):
       entity_pt = self.get_position()
       if not ore:
@@ -319,26 +288,28 @@ class MinerNotFull(Miner):
          ore.remove_entity(world)
          return ([ore_pt], True)
       else:
-         new_pt = actions.next_position(world, entity_pt, ore_pt)
+         new_pt = actions.next_position(world, entity_pt, ore_pt, Ore)
          return (world.move_entity(self, new_pt), False)
-   def create_miner_action(self, world, i_store):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
+   def miner_action(self, world, current_ticks, steps=1):
+      tiles = []
+      taken = 0
+      while taken < steps:
+         taken += 1
          entity_pt = self.get_position()
-         ore = world.find_nearest(entity_pt, Ore)
-         (tiles, found) = self.miner_to_ore(world, ore)
-
-         new_entity = self
-         if found:
-            new_entity = self.try_transform_miner(world,
-               self.try_transform_miner_not_full)
-
-         actions.schedule_action(world, new_entity,
-            new_entity.create_miner_action(world, i_store),
-            current_ticks + new_entity.get_rate())
-         return tiles
-      return action
+         (moved, found) = self.miner_to_ore(world,
+            self.find_move_target(world))
+         tiles.extend(moved)
+         if found or same_position(self.get_position(), entity_pt):
+            break
+
+      new_entity = self
+      if found:
+         new_entity = self.try_transform_miner(world,
+            self.try_transform_miner_not_full)
+
+      actions.schedule_move(world, new_entity, new_entity.miner_action_kind,
+         current_ticks + new_entity.get_rate())
+      return tiles
    def try_transform_miner_not_full(self, world):
       if self.resource_count < self.resource_limit:
          return self
@@ -351,12 +322,16 @@ class MinerNotFull(Miner):
 
 
 class MinerFull(Miner):
+   miner_action_kind = DELIVER_ACTION
+
    def __init__(self, name, resource_limit, position, rate, imgs, animation_rate):
       super(MinerFull, self).__init__(name, resource_limit, position, rate, imgs,
          animation_rate)
       self.resource_count = resource_limit
    def entity_string(self):
       return 'unknown'
+   def find_move_target(self, world):
+      return world.find_target(self.get_position(), Blacksmith)
    def miner_to_smith(self, world, smith):
       entity_pt = self.get_position()
       if not smith:
@@ -369,30 +344,49 @@ class MinerFull(Miner):
          self.set_resource_count(0)
          return ([], True)
       else:
-         new_pt = actions.next_position(world, entity_pt, smith_pt)
+         new_pt = actions.next_position(world, entity_pt, smith_pt,
+            Blacksmith)
          return (world.move_entity(self, new_pt), False)
-   def create_miner_action(self, world, i_store):
-      def action(current_ticks):
-         self.remove_pending_action(action)
-
+   def miner_action(self, world, current_ticks, steps=1):
+      tiles = []
+      taken = 0
+      while taken < steps:
+         taken += 1
          entity_pt = self.get_position()
-         smith = world.find_nearest(entity_pt, Blacksmith)
-         (tiles, found) = self.miner_to_smith(world, smith)
-
-         new_entity = self
-         if found:
-            new_entity = self.try_transform_miner(world,
-               self.try_transform_miner_full)
-
-         actions.schedule_action(world, new_entity,
-            new_entity.create_miner_action(world, i_store),
-            current_ticks + new_entity.get_rate())
-         return tiles
-      return action
+         (moved, found) = self.miner_to_smith(world,
+            self.find_move_target(world))
+         tiles.extend(moved)
+         if found or same_position(self.get_position(), entity_pt):
+            break
+
+      new_entity = self
+      if found:
+         new_entity = self.try_transform_miner(world,
+            self.try_transform_miner_full)
+
+      actions.schedule_move(world, new_entity, new_entity.miner_action_kind,
+         current_ticks + new_entity.get_rate())
+      return tiles
    def try_transform_miner_full(self, world):
       new_entity = MinerNotFull(
       self.get_name(), self.get_resource_limit(),
       self.get_position(), self.get_rate(),
       self.get_images(), self.get_animation_rate())
 
-      return new_entity
\ No newline at end of file
+      return new_entity
+
+
+def same_position(pt1, pt2):
+   return pt1.x == pt2.x and pt1.y == pt2.y
+
+
+ACTION_HANDLERS = {
+   ANIMATION_ACTION : Animated_Entities.animation_action,
+   VEIN_ACTION : Vein.vein_action,
+   ORE_TRANSFORM_ACTION : Ore.ore_transform_action,
+   ORE_BLOB_ACTION : OreBlob.ore_blob_action,
+   ENTITY_DEATH_ACTION : Quake.entity_death_action,
+   MINE_ACTION : MinerNotFull.miner_action,
+   DELIVER_ACTION : MinerFull.miner_action,
+}
+
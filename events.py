@@ -0,0 +1,46 @@
+import collections
+
+EntityAdded = collections.namedtuple('EntityAdded', 'entity')
+EntityMoved = collections.namedtuple('EntityMoved', 'entity old_pt new_pt')
+EntityRemoved = collections.namedtuple('EntityRemoved', 'entity pt')
+EntityTransformed = collections.namedtuple('EntityTransformed',
+   'old_entity new_entity')
+BackgroundChanged = collections.namedtuple('BackgroundChanged',
+   'pt old_background new_background')
+
+
+# Immediate subscribers are called synchronously from publish; batched
+# subscribers receive the list of events of their type once per flush,
+# which the world does at the end of every update_on_time.  Publishers
+# check wants() first so that unobserved event types cost a dict lookup.
+class EventBus:
+   def __init__(self):
+      self.subscribers = {}
+      self.batch_subscribers = {}
+      self.pending = {}
+   def subscribe(self, event_type, handler, batched=False):
+      table = self.batch_subscribers if batched else self.subscribers
+      table.setdefault(event_type, []).append(handler)
+   def unsubscribe(self, event_type, handler):
+      for table in (self.subscribers, self.batch_subscribers):
+         handlers = table.get(event_type, [])
+         if handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+               del table[event_type]
+   def wants(self, event_type):
+      return (event_type in self.subscribers or
+         event_type in self.batch_subscribers)
+   def publish(self, event):
+      event_type = type(event)
+      for handler in self.subscribers.get(event_type, ()):
+         handler(event)
+      if event_type in self.batch_subscribers:
+         self.pending.setdefault(event_type, []).append(event)
+   def flush(self):
+      if self.pending:
+         pending = self.pending
+         self.pending = {}
+         for (event_type, batch) in pending.items():
+            for handler in self.batch_subscribers.get(event_type, ()):
+               handler(batch)
@@ -0,0 +1,182 @@
+import argparse
+import checkpoint
+import entities
+import image_store
+import lod
+import main as game
+import random
+import save_load
+import sim_clock
+import time
+import tracing
+import worldmodel
+
+IMAGE_LIST_FILE_NAME = game.IMAGE_LIST_FILE_NAME
+WORLD_FILE = game.WORLD_FILE
+
+WORLD_COLS = game.SCREEN_WIDTH // game.TILE_WIDTH * game.WORLD_WIDTH_SCALE
+WORLD_ROWS = game.SCREEN_HEIGHT // game.TILE_HEIGHT * game.WORLD_HEIGHT_SCALE
+VIEW_COLS = game.SCREEN_WIDTH // game.TILE_WIDTH
+VIEW_ROWS = game.SCREEN_HEIGHT // game.TILE_HEIGHT
+
+TICK_STEP = 100
+DEFAULT_DURATION = 60000
+PAUSED_SLEEP = 0.01
+
+
+def create_world(filename, num_cols=WORLD_COLS, num_rows=WORLD_ROWS,
+   run=True):
+   (world, i_store, timings) = load_world(filename, num_cols, num_rows, run)
+   return (world, i_store)
+
+
+def load_world(filename, num_cols=WORLD_COLS, num_rows=WORLD_ROWS, run=True):
+   i_store = image_store.load_image_names(IMAGE_LIST_FILE_NAME)
+   default_background = entities.Background(image_store.DEFAULT_IMAGE_NAME,
+      image_store.get_images(i_store, image_store.DEFAULT_IMAGE_NAME))
+   world = worldmodel.WorldModel(num_rows, num_cols, default_background)
+   with open(filename, 'r') as file:
+      timings = save_load.load_world_bulk(world, i_store, file, run)
+   return (world, i_store, timings)
+
+
+def run(world, duration, clock=None, server=None, realtime=False,
+   recorder=None, checkpoint_file=None, checkpoint_interval=None):
+   if clock is None:
+      clock = sim_clock.SimClock(step=TICK_STEP)
+   end = None if duration is None else clock.get_ticks() + duration
+   next_checkpoint = None
+   if checkpoint_file and checkpoint_interval:
+      next_checkpoint = clock.get_ticks() + checkpoint_interval
+   last = time.monotonic()
+   while end is None or clock.get_ticks() < end:
+      if server:
+         server.poll(world, clock)
+
+      if realtime:
+         time.sleep(clock.step_size / 1000.0)
+         now = time.monotonic()
+         elapsed = (now - last) * 1000
+         last = now
+      else:
+         elapsed = clock.step_size
+
+      before = clock.get_ticks()
+      ticks = clock.advance(elapsed)
+      if ticks == before:
+         time.sleep(PAUSED_SLEEP)
+      else:
+         tiles = world.update_on_time(ticks)
+         if recorder:
+            recorder.write_frame(ticks, tiles)
+         if next_checkpoint is not None and ticks >= next_checkpoint:
+            checkpoint.save_checkpoint(checkpoint_file, world, ticks)
+            next_checkpoint = ticks + checkpoint_interval
+
+   return clock
+
+
+def entity_summary(world):
+   counts = {}
+   for entity in world.get_entities():
+      kind = type(entity).__name__
+      counts[kind] = counts.get(kind, 0) + 1
+   return ' '.join(kind + '=' + str(counts[kind]) for kind in sorted(counts))
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Run a world without a display.')
+   parser.add_argument('world', nargs='?', default=WORLD_FILE)
+   parser.add_argument('--ticks', type=int, default=DEFAULT_DURATION,
+      help='simulated milliseconds to run (0 runs forever)')
+   parser.add_argument('--seed', type=int)
+   parser.add_argument('--realtime', action='store_true',
+      help='pace the simulation against the wall clock')
+   parser.add_argument('--control', metavar='PATH',
+      help='serve telemetry and control requests on a unix socket')
+   parser.add_argument('--record', metavar='TARGET',
+      help='write a tile-diff stream to a file or unix:PATH')
+   parser.add_argument('--size', type=int, nargs=2,
+      metavar=('COLS', 'ROWS'), default=(WORLD_COLS, WORLD_ROWS))
+   parser.add_argument('--load-timing', action='store_true',
+      help='report world load time per phase')
+   parser.add_argument('--batch-moves', action='store_true',
+      help='apply each tick\'s moves together with tile reservations')
+   parser.add_argument('--pathfinding', action='store_true',
+      help='route movers around static obstacles')
+   parser.add_argument('--distance-fields', action='store_true',
+      help='walk miners down shared distance fields to ore and blacksmiths')
+   parser.add_argument('--lod', type=int, metavar='RADIUS',
+      help='simulate coarsely beyond RADIUS tiles of the initial view')
+   parser.add_argument('--lod-steps', type=int, default=lod.LOD_STEPS,
+      help='steps a far mover takes per action')
+   parser.add_argument('--trace', metavar='PATH', nargs='?',
+      const=tracing.TRACE_FILE,
+      help='write a trace of the executed actions when the run ends')
+   parser.add_argument('--checkpoint', metavar='PATH',
+      help='write the full running state here when the run ends')
+   parser.add_argument('--checkpoint-interval', type=int, metavar='TICKS',
+      help='also write the checkpoint every TICKS simulated milliseconds')
+   parser.add_argument('--resume', metavar='PATH',
+      help='continue from a checkpoint instead of loading a world file')
+   args = parser.parse_args()
+
+   random.seed(args.seed)
+   clock = sim_clock.SimClock(step=TICK_STEP)
+   if args.resume:
+      i_store = image_store.load_image_names(IMAGE_LIST_FILE_NAME)
+      start = time.perf_counter()
+      (world, ticks) = checkpoint.load_checkpoint(args.resume, i_store)
+      clock = sim_clock.SimClock(ticks, step=TICK_STEP)
+      if args.load_timing:
+         print('resume %.1fms' % ((time.perf_counter() - start) * 1000))
+   else:
+      (world, i_store, timings) = load_world(args.world, args.size[0],
+         args.size[1])
+      if args.load_timing:
+         print('load ' + save_load.format_timings(timings))
+   if args.batch_moves:
+      world.enable_batched_movement()
+   if args.pathfinding:
+      world.enable_pathfinding()
+   if args.distance_fields:
+      world.enable_distance_fields()
+   if args.lod is not None:
+      world.enable_lod(args.lod, args.lod_steps)
+      world.lod.set_view((0, 0, VIEW_COLS, VIEW_ROWS), clock.get_ticks())
+   tracer = None
+   if args.trace:
+      tracer = tracing.Tracer(args.trace)
+      world.enable_tracing(tracer)
+
+   server = None
+   if args.control:
+      import telemetry
+      server = telemetry.start_server(args.control)
+
+   recorder = None
+   if args.record:
+      import tile_stream
+      recorder = tile_stream.start_recording(args.record, world, i_store)
+
+   try:
+      clock = run(world, args.ticks or None, clock, server=server,
+         realtime=args.realtime, recorder=recorder,
+         checkpoint_file=args.checkpoint,
+         checkpoint_interval=args.checkpoint_interval)
+   finally:
+      if server:
+         server.stop()
+      if recorder:
+         recorder.close()
+      if tracer:
+         tracer.flush()
+
+   if args.checkpoint:
+      checkpoint.save_checkpoint(args.checkpoint, world, clock.get_ticks())
+   print('ticks=' + str(clock.get_ticks()) + ' ' + entity_summary(world))
+
+
+if __name__ == '__main__':
+   main()
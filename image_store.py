@@ -1,10 +1,12 @@
-import pygame
+# pygame is imported only by the functions that build surfaces, so the
+# simulation modules can use get_images without loading it.
 
 DEFAULT_IMAGE_NAME = 'background_default'
 DEFAULT_IMAGE_COLOR = (128, 128, 128, 0)
 
 
 def create_default_image(tile_width, tile_height):
+   import pygame
    surf = pygame.Surface((tile_width, tile_height))
    surf.fill(DEFAULT_IMAGE_COLOR)
    return surf
@@ -23,7 +25,24 @@ def load_images(filename, tile_width, tile_height):
    return images
 
 
+def load_image_names(filename):
+   images = {}
+   with open(filename) as fstr:
+      for line in fstr:
+         attrs = line.split()
+         if len(attrs) >= 2:
+            imgs = get_images_internal(images, attrs[0])
+            imgs.append(attrs[1])
+            images[attrs[0]] = imgs
+
+   if DEFAULT_IMAGE_NAME not in images:
+      images[DEFAULT_IMAGE_NAME] = [DEFAULT_IMAGE_NAME]
+
+   return images
+
+
 def process_image_line(images, line):
+   import pygame
    attrs = line.split()
    if len(attrs) >= 2:
       key = attrs[0]
@@ -42,6 +61,30 @@ def process_image_line(images, line):
             img.set_colorkey(pygame.Color(r, g, b, a))
 
 
+def build_mipmaps(images, levels):
+   mipmaps = [{}]
+   for level in range(1, levels + 1):
+      finer = mipmaps[level - 1]
+      scaled = {}
+      for imgs in images.values():
+         for img in imgs:
+            if id(img) not in scaled:
+               scaled[id(img)] = halve_image(finer.get(id(img), img))
+      mipmaps.append(scaled)
+   return mipmaps
+
+
+def halve_image(img):
+   import pygame
+   (width, height) = img.get_size()
+   small = pygame.transform.scale(img, (max(width // 2, 1),
+      max(height // 2, 1)))
+   colorkey = img.get_colorkey()
+   if colorkey:
+      small.set_colorkey(colorkey)
+   return small
+
+
 def get_images_internal(images, key):
    if key in images:
       return images[key]
@@ -2,6 +2,9 @@ import pygame
 
 SAVE_KEY = pygame.K_s
 LOAD_KEY = pygame.K_l
+ZOOM_IN_KEY = pygame.K_EQUALS
+ZOOM_OUT_KEY = pygame.K_MINUS
+TRACE_KEY = pygame.K_t
 ENTITY_KEYS = {pygame.K_1 : 'grass',
                pygame.K_2 : 'rocks',
                pygame.K_3 : 'obstacle',
@@ -0,0 +1,80 @@
+import actions
+import entities
+
+LOD_RADIUS = 10
+LOD_STEPS = 1
+LOD_WINDOW = 4000
+
+
+# Level of detail around the viewport.  Inside the view grown by the radius
+# everything runs as usual; outside it animation actions are dropped, which
+# leaves the simulation itself untouched.  With more than one step a far
+# mover's action also takes up to `steps` single steps at once (fewer for
+# slow movers, so one action never covers more than LOD_WINDOW ticks).
+# Such an action runs at the time of its last step, so no step is taken
+# early, and stops short of the mover's target so that the step reaching
+# ore, a smith or a vein runs on its own; the next action follows from then
+# as in the full simulation.  Its steps still see the world as it is at the
+# end of their interval, and in the race between miners and ore corruption
+# that is enough to shift totals, so the default is one step per action.
+# The step count travels in the action's args: when the view reaches an
+# entity, its pending action is swapped for a single step at the time the
+# stepped one would have started and its animation is restarted.
+class DetailRegion:
+   def __init__(self, world, radius=LOD_RADIUS, steps=LOD_STEPS):
+      self.world = world
+      self.radius = radius
+      self.steps = steps
+      self.bounds = (0, 0, 0, 0)
+   def is_near(self, pt):
+      return within(self.bounds, pt)
+   def steps_for(self, entity):
+      pt = entity.get_position()
+      if self.world.movement or self.is_near(pt):
+         return 1
+      steps = min(self.steps, LOD_WINDOW // entity.get_rate())
+      if steps > 1:
+         target = entity.find_move_target(self.world)
+         if target:
+            tpt = target.get_position()
+            steps = min(steps, abs(pt.x - tpt.x) + abs(pt.y - tpt.y) - 1)
+      return max(1, steps)
+   def set_view(self, rect, ticks):
+      (left, top, width, height) = rect
+      bounds = (left - self.radius, top - self.radius,
+         left + width + self.radius, top + height + self.radius)
+      if bounds == self.bounds:
+         return []
+
+      old_bounds = self.bounds
+      self.bounds = bounds
+      arrived = [entity for entity in self.world.get_entities()
+         if isinstance(entity, entities.Animated_Entities) and
+         within(bounds, entity.get_position()) and
+         not within(old_bounds, entity.get_position())]
+
+      for entity in arrived:
+         self.resync(entity, ticks)
+      return [entity.get_position() for entity in arrived]
+   def resync(self, entity, ticks):
+      for action in list(entity.get_pending_actions()):
+         if action.kind in entities.STEPPED_ACTIONS and action.args:
+            self.world.unschedule_action(action)
+            entity.remove_pending_action(action)
+            (steps,) = action.args
+            actions.schedule_action(self.world, entity, action.kind,
+               actions.move_start(entity, action.time, steps))
+      self.resume_animation(entity, ticks)
+   def resume_animation(self, entity, ticks):
+      if self.world.get_entity(entity.id) is not entity:
+         return
+      for action in entity.get_pending_actions():
+         if action.kind == entities.ANIMATION_ACTION:
+            return
+      actions.schedule_action(self.world, entity, entities.ANIMATION_ACTION,
+         ticks + entity.get_animation_rate(), (0,))
+
+
+def within(bounds, pt):
+   (left, top, right, bottom) = bounds
+   return left <= pt.x < right and top <= pt.y < bottom
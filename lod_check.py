@@ -0,0 +1,105 @@
+import argparse
+import collections
+import entities
+import headless
+import lod
+import math
+import random
+import statistics
+import sys
+
+DEFAULT_SEEDS = 30
+DEFAULT_TICKS = 900000
+DEFAULT_RADIUS = 0
+Z_LIMIT = 3.0
+
+Totals = collections.namedtuple('Totals',
+   'smith_resources ore_count blob_count')
+
+
+def count_totals(world):
+   smith_resources = 0
+   ores = 0
+   blobs = 0
+   for entity in world.get_entities():
+      if isinstance(entity, entities.Blacksmith):
+         smith_resources += entity.get_resource_count()
+      elif isinstance(entity, entities.Ore):
+         ores += 1
+      elif isinstance(entity, entities.OreBlob):
+         blobs += 1
+   return Totals(smith_resources, ores, blobs)
+
+
+def run_seed(world_file, size, seed, ticks, radius=None, steps=None):
+   random.seed(seed)
+   (world, i_store) = headless.create_world(world_file, size[0], size[1])
+   if radius is not None:
+      world.enable_lod(radius, steps)
+      world.lod.set_view((0, 0, headless.VIEW_COLS, headless.VIEW_ROWS), 0)
+   headless.run(world, ticks)
+   return count_totals(world)
+
+
+# The same seeds are run with and without level of detail and each total
+# is compared by its difference in means over the standard error of that
+# difference; a coarse simulation that drifts shows up as a large score.
+def compare(full, coarse, z_limit=Z_LIMIT):
+   rows = []
+   problems = []
+   for column in Totals._fields:
+      a = [getattr(totals, column) for totals in full]
+      b = [getattr(totals, column) for totals in coarse]
+      error = math.sqrt((statistics.variance(a) + statistics.variance(b)) /
+         len(a))
+      diff = statistics.mean(b) - statistics.mean(a)
+      if error:
+         score = diff / error
+      else:
+         score = 0.0 if diff == 0 else math.copysign(float('inf'), diff)
+      rows.append((column, statistics.mean(a), statistics.mean(b), score))
+      if abs(score) > z_limit:
+         problems.append('%s differs by %.1f standard errors' % (column,
+            score))
+   return (rows, problems)
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Check that level of detail leaves the totals of many '
+      'seeded runs unchanged.')
+   parser.add_argument('world', nargs='?', default=headless.WORLD_FILE)
+   parser.add_argument('--seeds', type=int, default=DEFAULT_SEEDS)
+   parser.add_argument('--ticks', type=int, default=DEFAULT_TICKS)
+   parser.add_argument('--radius', type=int, default=DEFAULT_RADIUS,
+      help='level of detail radius around the initial view')
+   parser.add_argument('--steps', type=int, default=lod.LOD_STEPS)
+   parser.add_argument('--size', type=int, nargs=2,
+      metavar=('COLS', 'ROWS'),
+      default=(headless.WORLD_COLS, headless.WORLD_ROWS))
+   parser.add_argument('--z-limit', type=float, default=Z_LIMIT,
+      help='standard errors the means may differ by')
+   args = parser.parse_args()
+   if args.seeds < 2:
+      parser.error('--seeds must be at least 2')
+
+   full = [run_seed(args.world, args.size, seed, args.ticks)
+      for seed in range(args.seeds)]
+   coarse = [run_seed(args.world, args.size, seed, args.ticks, args.radius,
+      args.steps) for seed in range(args.seeds)]
+   (rows, problems) = compare(full, coarse, args.z_limit)
+
+   print('%-16s %10s %10s %8s' % ('total', 'full', 'lod', 'score'))
+   for (column, full_mean, coarse_mean, score) in rows:
+      print('%-16s %10.1f %10.1f %+8.1f' % (column, full_mean, coarse_mean,
+         score))
+
+   for problem in problems:
+      print('FAIL: ' + problem)
+   if problems:
+      sys.exit(1)
+   print('PASS: %d seeds over %d simulated ms' % (args.seeds, args.ticks))
+
+
+if __name__ == '__main__':
+   main()
@@ -1,12 +1,13 @@
-import controller
+import argparse
+import checkpoint
 import entities
 import image_store
-import pygame
 import random
 import save_load
+import sim_clock
 import sys
+import tracing
 import worldmodel
-import worldview
 
 RUN_AFTER_LOAD = True
 
@@ -28,10 +29,36 @@ def create_default_background(img):
 
 def load_world(world, i_store, filename):
    with open(filename, 'r') as file:
-      save_load.load_world(world, i_store, file, RUN_AFTER_LOAD)
+      return save_load.load_world_bulk(world, i_store, file, RUN_AFTER_LOAD)
 
 
 def main():
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--control', metavar='PATH',
+      help='serve telemetry and control requests on a unix socket')
+   parser.add_argument('--record', metavar='TARGET',
+      help='write a tile-diff stream to a file or unix:PATH')
+   parser.add_argument('--load-timing', action='store_true',
+      help='report world load time per phase')
+   parser.add_argument('--pathfinding', action='store_true',
+      help='route movers around static obstacles')
+   parser.add_argument('--distance-fields', action='store_true',
+      help='walk miners down shared distance fields to ore and blacksmiths')
+   parser.add_argument('--resume', metavar='PATH',
+      help='continue from a checkpoint instead of loading the world file')
+   parser.add_argument('--lod', type=int, metavar='RADIUS',
+      help='simulate coarsely beyond RADIUS tiles of the view')
+   parser.add_argument('--trace', metavar='PATH', nargs='?',
+      const=tracing.TRACE_FILE,
+      help='trace actions and drawing; written on exit and on the trace key')
+   parser.add_argument('--sim-thread', action='store_true',
+      help='run the simulation on its own thread and draw from snapshots')
+   args = parser.parse_args()
+
+   import controller
+   import pygame
+   import worldview
+
    random.seed()
    pygame.init()
    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -44,15 +71,64 @@ def main():
    default_background = create_default_background(
       image_store.get_images(i_store, image_store.DEFAULT_IMAGE_NAME))
 
-   world = worldmodel.WorldModel(num_rows, num_cols, default_background)
+   if args.resume:
+      (world, ticks) = checkpoint.load_checkpoint(args.resume, i_store,
+         pygame.time.get_ticks())
+   else:
+      world = worldmodel.WorldModel(num_rows, num_cols, default_background)
+      timings = load_world(world, i_store, WORLD_FILE)
+      if args.load_timing:
+         print('load ' + save_load.format_timings(timings))
+
+   display_world = world
+   if args.sim_thread:
+      import sim_thread
+      display_world = sim_thread.WorldMirror(world)
    view = worldview.WorldView(SCREEN_WIDTH // TILE_WIDTH,
-      SCREEN_HEIGHT // TILE_HEIGHT, screen, world, TILE_WIDTH, TILE_HEIGHT)
-
-   load_world(world, i_store, WORLD_FILE)
-
+      SCREEN_HEIGHT // TILE_HEIGHT, screen, display_world, TILE_WIDTH,
+      TILE_HEIGHT,
+      mipmaps=image_store.build_mipmaps(i_store, worldview.MAX_ZOOM))
+
+   if args.pathfinding:
+      world.enable_pathfinding()
+   if args.distance_fields:
+      world.enable_distance_fields()
+   if args.lod is not None:
+      world.enable_lod(args.lod)
+   tracer = None
+   if args.trace:
+      tracer = tracing.Tracer(args.trace)
+      world.enable_tracing(tracer)
+      view.enable_tracing(tracer)
+
+   view.enable_minimap()
    view.update_view()
 
-   controller.activity_loop(view, world)
+   server = None
+   if args.control:
+      import telemetry
+      server = telemetry.start_server(args.control)
+
+   recorder = None
+   if args.record:
+      import tile_stream
+      recorder = tile_stream.start_recording(args.record, world, i_store)
+
+   try:
+      if args.sim_thread:
+         clock = sim_clock.SimClock(pygame.time.get_ticks(),
+            step=controller.TIMER_FREQUENCY)
+         controller.threaded_activity_loop(view, display_world,
+            sim_thread.SimulationThread(world, clock, server, recorder))
+      else:
+         controller.activity_loop(view, world, server, recorder)
+   finally:
+      if server:
+         server.stop()
+      if recorder:
+         recorder.close()
+      if tracer:
+         tracer.flush()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,255 @@
+import argparse
+import gc
+import headless
+import random
+import sys
+import tracemalloc
+import types
+
+DEFAULT_INTERVAL = 60000
+DEFAULT_SAMPLES = 10
+TOP_SITES = 10
+ENTITY_PREFIX = 'entity '
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 256
+TRACKED_MODULES = ('actions', 'entities', 'occ_grid', 'ordered_list',
+   'point', 'worldmodel')
+
+
+def deep_size(obj, seen):
+   size = 0
+   stack = [obj]
+   while stack:
+      obj = stack.pop()
+      if id(obj) in seen:
+         continue
+      seen.add(id(obj))
+      size += sys.getsizeof(obj)
+
+      if isinstance(obj, dict):
+         stack.extend(obj.keys())
+         stack.extend(obj.values())
+      elif isinstance(obj, (list, tuple, set, frozenset)):
+         stack.extend(obj)
+      elif isinstance(obj, types.FunctionType):
+         stack.extend(cell.cell_contents for cell in obj.__closure__ or ())
+      elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+         stack.append(obj.__dict__)
+   return size
+
+
+# Objects that any entity may refer to without owning them: the cached
+# small integers, None and the booleans, and the names and constants of
+# the game's code, which include every attribute name used as an instance
+# dict key.  They are never charged, so which subsystem reaches them first
+# cannot move bytes between subsystems.
+def shared_objects():
+   shared = [None, True, False] + list(range(SMALL_INT_MIN, SMALL_INT_MAX + 1))
+   codes = []
+   for name in TRACKED_MODULES:
+      for value in vars(sys.modules[name]).values():
+         if isinstance(value, type):
+            shared.extend(vars(value).keys())
+            codes.extend(member.__code__ for member in vars(value).values()
+               if isinstance(member, types.FunctionType))
+         elif isinstance(value, types.FunctionType):
+            codes.append(value.__code__)
+   while codes:
+      code = codes.pop()
+      shared.extend(code.co_names)
+      shared.extend(code.co_varnames)
+      for const in code.co_consts:
+         if isinstance(const, types.CodeType):
+            codes.append(const)
+         else:
+            shared.append(const)
+   return set(id(obj) for obj in shared)
+
+
+def subsystem_sizes(world, i_store):
+   # Objects reached from an earlier subsystem are not charged again, and
+   # the world itself, the shared images and the shared objects above are
+   # never charged.
+   seen = shared_objects()
+   seen.update([id(world), id(i_store)])
+   for imgs in i_store.values():
+      seen.add(id(imgs))
+      seen.update(id(img) for img in imgs)
+
+   report = []
+   grids = [world.occupancy.cells, world.background.rows]
+   rows = [row for grid in grids for row in grid]
+   report.append(('grid lists', sum(sys.getsizeof(obj)
+      for obj in grids + rows) +
+      deep_size(world.occupancy.occupied_rows, seen), len(rows)))
+
+   backgrounds = world.background.palette
+   report.append(('backgrounds', sum(deep_size(bgnd, seen)
+      for bgnd in backgrounds) + deep_size(world.background.kinds, seen),
+      len(backgrounds)))
+
+   actions = [action for entity in world.get_entities()
+      for action in entity_pending_actions(entity)]
+   entity_seen = set(seen)
+   entity_seen.update(id(action) for action in actions)
+   by_type = {}
+   for entity in world.get_entities():
+      kind = ENTITY_PREFIX + type(entity).__name__
+      (size, count) = by_type.get(kind, (0, 0))
+      by_type[kind] = (size + deep_size(entity, entity_seen), count + 1)
+   for kind in sorted(by_type):
+      report.append((kind,) + by_type[kind])
+   seen.update(entity_seen)
+   seen.difference_update(id(action) for action in actions)
+
+   report.append(('pending actions', sum(deep_size(action, seen)
+      for action in actions), len(actions)))
+   queue = world.action_queue
+   report.append(('action queue', deep_size(queue.list, seen) +
+      deep_size(queue.entries, seen), queue.size()))
+   report.append(('vein targets', deep_size(world.vein_targets, seen),
+      len(world.vein_targets)))
+   return report
+
+
+def entity_pending_actions(entity):
+   if hasattr(entity, 'get_pending_actions'):
+      return entity.get_pending_actions()
+   return []
+
+
+def object_counts():
+   gc.collect()
+   counts = {}
+   for obj in gc.get_objects():
+      kind = type(obj)
+      if kind.__module__ in TRACKED_MODULES:
+         name = kind.__module__ + '.' + kind.__name__
+      elif (kind is types.FunctionType and
+         obj.__module__ in TRACKED_MODULES and
+         '<locals>' in obj.__qualname__):
+         name = obj.__module__ + '.' + obj.__qualname__
+      else:
+         continue
+      counts[name] = counts.get(name, 0) + 1
+   return counts
+
+
+def print_report(report, counts, snapshot):
+   print('%-28s %12s %10s' % ('subsystem', 'bytes', 'objects'))
+   for (name, size, count) in report:
+      print('%-28s %12d %10d' % (name, size, count))
+   print('%-28s %12d' % ('total', sum(row[1] for row in report)))
+
+   print('\n%-52s %10s' % ('live objects', 'count'))
+   for name in sorted(counts):
+      print('%-52s %10d' % (name, counts[name]))
+
+   snapshot = snapshot.filter_traces([
+      tracemalloc.Filter(False, __file__),
+      tracemalloc.Filter(False, tracemalloc.__file__)])
+   stats = snapshot.statistics('lineno')
+   print('\ntraced allocations: %d bytes' % sum(stat.size for stat in stats))
+   for stat in stats[:TOP_SITES]:
+      frame = stat.traceback[0]
+      print('%10d bytes %8d blocks  %s:%d' % (stat.size, stat.count,
+         frame.filename, frame.lineno))
+
+
+def print_growth(history):
+   names = []
+   for (ticks, report, counts) in history:
+      names.extend(row[0] for row in report if row[0] not in names)
+
+   print('%-28s' % 'ticks' + ''.join('%12d' % ticks
+      for (ticks, report, counts) in history))
+   for name in names:
+      sizes = [size_by_name(report, name)
+         for (ticks, report, counts) in history]
+      print('%-28s' % name + ''.join('%12d' % size for size in sizes) +
+         growth_flag(sizes))
+
+   print('\n%-52s %10s %10s' % ('live objects', 'first', 'last'))
+   first = history[0][2]
+   last = history[-1][2]
+   for name in sorted(set(first) | set(last)):
+      series = [counts.get(name, 0) for (ticks, report, counts) in history]
+      print('%-52s %10d %10d' % (name, series[0], series[-1]) +
+         growth_flag(series))
+
+
+def size_by_name(report, name):
+   row = row_by_name(report, name)
+   return row[1] if row else 0
+
+
+def row_by_name(report, name):
+   for row in report:
+      if row[0] == name:
+         return row
+   return None
+
+
+# Kinds of entity flagged as growing although there were as many of them in
+# every sample; static parts of a running world, like the obstacles, should
+# never show up here.
+def static_growth(history):
+   problems = []
+   for (name, size, count) in history[0][1]:
+      if not name.startswith(ENTITY_PREFIX):
+         continue
+      rows = [row_by_name(report, name) for (ticks, report, counts) in history]
+      if (all(row and row[2] == count for row in rows) and
+         growth_flag([row[1] for row in rows])):
+         problems.append(name)
+   return problems
+
+
+def growth_flag(series):
+   rising = all(later > earlier
+      for (earlier, later) in zip(series, series[1:]))
+   return '  GROWING' if len(series) > 2 and rising else ''
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Report memory use of a loaded or running world.')
+   parser.add_argument('world', nargs='?', default=headless.WORLD_FILE)
+   parser.add_argument('--ticks', type=int, default=0,
+      help='simulated milliseconds to run before reporting')
+   parser.add_argument('--seed', type=int, default=0)
+   parser.add_argument('--track', action='store_true',
+      help='diff snapshots taken every --interval simulated milliseconds')
+   parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL)
+   parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+   parser.add_argument('--check', action='store_true',
+      help='with --track, fail if a kind of entity whose count never '
+      'changed is flagged as growing')
+   args = parser.parse_args()
+
+   random.seed(args.seed)
+   tracemalloc.start()
+   (world, i_store) = headless.create_world(args.world)
+   clock = headless.run(world, args.ticks)
+
+   if args.track:
+      history = []
+      for sample in range(0, args.samples):
+         history.append((clock.get_ticks(), subsystem_sizes(world, i_store),
+            object_counts()))
+         headless.run(world, args.interval, clock)
+      print_growth(history)
+      if args.check:
+         problems = static_growth(history)
+         for name in problems:
+            print('FAIL: ' + name + ' grew with the same objects')
+         if problems:
+            sys.exit(1)
+         print('PASS: no kind of entity grew without gaining members')
+   else:
+      print_report(subsystem_sizes(world, i_store), object_counts(),
+         tracemalloc.take_snapshot())
+
+
+if __name__ == '__main__':
+   main()
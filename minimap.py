@@ -0,0 +1,77 @@
+import entities
+import point
+import pygame
+
+MINIMAP_MARGIN = 4
+MINIMAP_MAX_FRACTION = 0.25
+VIEWPORT_COLOR = (255, 255, 255)
+DEFAULT_BACKGROUND_COLOR = (128, 128, 128)
+DEFAULT_OCCUPANT_COLOR = (255, 0, 255)
+
+BACKGROUND_COLORS = {'grass' : (34, 139, 34),
+                     'rocks' : (120, 110, 100)
+                     }
+
+OCCUPANT_COLORS = {entities.Obstacle : (60, 60, 60),
+                   entities.MinerNotFull : (255, 220, 0),
+                   entities.MinerFull : (255, 140, 0),
+                   entities.Vein : (150, 75, 0),
+                   entities.Ore : (200, 200, 255),
+                   entities.OreBlob : (160, 0, 200),
+                   entities.Quake : (255, 0, 0),
+                   entities.Blacksmith : (0, 120, 255)
+                   }
+
+# One pixel per tile, or for worlds too large to fit in the corner of the
+# screen, one pixel per square block of tiles showing the block's top-left
+# tile.
+class Minimap:
+   def __init__(self, world, screen_width, screen_height):
+      self.world = world
+      self.scale = max(1,
+         -(-world.num_cols // int(screen_width * MINIMAP_MAX_FRACTION)),
+         -(-world.num_rows // int(screen_height * MINIMAP_MAX_FRACTION)))
+      width = -(-world.num_cols // self.scale)
+      height = -(-world.num_rows // self.scale)
+      self.surface = pygame.Surface((width, height))
+      self.rect = pygame.Rect(
+         screen_width - width - MINIMAP_MARGIN - 1,
+         screen_height - height - MINIMAP_MARGIN - 1,
+         width + 2, height + 2)
+      for y in range(0, height):
+         for x in range(0, width):
+            self.update_pixel(x, y)
+   def update_pixel(self, x, y):
+      self.surface.set_at((x, y), tile_color(self.world,
+         point.Point(x * self.scale, y * self.scale)))
+   def update_tile(self, pt):
+      if pt.x % self.scale == 0 and pt.y % self.scale == 0:
+         self.update_pixel(pt.x // self.scale, pt.y // self.scale)
+   def update_tiles(self, tiles):
+      for tile in tiles:
+         if self.world.within_bounds(tile):
+            self.update_tile(tile)
+   def draw(self, screen, viewport):
+      screen.fill(VIEWPORT_COLOR, self.rect)
+      screen.blit(self.surface, (self.rect.left + 1, self.rect.top + 1))
+      scaled = pygame.Rect(viewport.left // self.scale,
+         viewport.top // self.scale, max(viewport.width // self.scale, 1),
+         max(viewport.height // self.scale, 1))
+      pygame.draw.rect(screen, VIEWPORT_COLOR,
+         scaled.move(self.rect.left + 1, self.rect.top + 1), 1)
+      return self.rect
+   def tile_at(self, pos):
+      if self.rect.collidepoint(pos):
+         return point.Point(
+            min(max((pos[0] - self.rect.left - 1) * self.scale, 0),
+               self.world.num_cols - 1),
+            min(max((pos[1] - self.rect.top - 1) * self.scale, 0),
+               self.world.num_rows - 1))
+      return None
+
+def tile_color(world, pt):
+   occupant = world.get_tile_occupant(pt)
+   if occupant:
+      return OCCUPANT_COLORS.get(occupant.get_kind(), DEFAULT_OCCUPANT_COLOR)
+   bgnd = world.get_background(pt)
+   return BACKGROUND_COLORS.get(bgnd.get_name(), DEFAULT_BACKGROUND_COLOR)
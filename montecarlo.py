@@ -0,0 +1,181 @@
+import actions
+import argparse
+import concurrent.futures
+import csv
+import entities
+import headless
+import itertools
+import os
+import random
+
+DEFAULT_DURATION = 600000
+DEFAULT_SAMPLE_INTERVAL = 10000
+DEFAULT_SEEDS = 8
+DEFAULT_OUTPUT = 'montecarlo.csv'
+
+MINER_LIMIT = 'MINER_LIMIT'
+
+# Tunable module constants; MINER_LIMIT is applied to the loaded miners
+# instead since their limit comes from the world file.
+MODULE_PARAMETERS = {'ORE_CORRUPT_MIN' : actions,
+                     'ORE_CORRUPT_MAX' : actions,
+                     'VEIN_RATE_MIN' : actions,
+                     'VEIN_RATE_MAX' : actions,
+                     'BLOB_RATE_SCALE' : entities
+                     }
+
+DEFAULTS = dict((name, getattr(module, name))
+   for (name, module) in MODULE_PARAMETERS.items())
+
+SAMPLE_COLUMNS = ['ticks', 'smith_resources', 'blob_count', 'ore_count',
+   'ore_lifetime_mean', 'miner_idle_ticks']
+
+
+def apply_parameters(params):
+   for (name, module) in MODULE_PARAMETERS.items():
+      setattr(module, name, params.get(name, DEFAULTS[name]))
+
+
+def apply_miner_limit(world, params):
+   if MINER_LIMIT in params:
+      for entity in world.get_entities():
+         if isinstance(entity, entities.Miner):
+            entity.resource_limit = params[MINER_LIMIT]
+
+
+class RunStats:
+   def __init__(self):
+      self.ore_births = {}
+      self.ore_lifetimes = []
+      self.miner_states = {}
+      self.miner_idle_ticks = 0
+   def observe(self, world, ticks, step):
+      ores = set()
+      for entity in world.get_entities():
+         if isinstance(entity, entities.Ore):
+            ores.add(entity)
+            self.ore_births.setdefault(entity, ticks)
+         elif isinstance(entity, entities.Miner):
+            self.observe_miner(entity, ticks, step)
+
+      for ore in [ore for ore in self.ore_births if ore not in ores]:
+         self.ore_lifetimes.append(ticks - self.ore_births.pop(ore))
+   def observe_miner(self, miner, ticks, step):
+      # A miner is idle once a whole action period passes without it
+      # moving or changing its load.
+      state = (miner.get_position().x, miner.get_position().y,
+         miner.get_resource_count())
+      (last_state, last_change) = self.miner_states.get(miner.get_name(),
+         (None, ticks))
+      if state != last_state:
+         last_change = ticks
+      elif ticks - last_change > miner.get_rate():
+         self.miner_idle_ticks += step
+      self.miner_states[miner.get_name()] = (state, last_change)
+   def sample(self, world, ticks):
+      smith_resources = 0
+      blobs = 0
+      for entity in world.get_entities():
+         if isinstance(entity, entities.Blacksmith):
+            smith_resources += entity.get_resource_count()
+         elif isinstance(entity, entities.OreBlob):
+            blobs += 1
+      lifetimes = self.ore_lifetimes
+      return [ticks, smith_resources, blobs, len(self.ore_births),
+         sum(lifetimes) / len(lifetimes) if lifetimes else None,
+         self.miner_idle_ticks]
+
+
+def run_simulation(world_path, params, seed, duration, sample_interval):
+   apply_parameters(params)
+   random.seed(seed)
+   (world, i_store) = headless.create_world(world_path)
+   apply_miner_limit(world, params)
+
+   stats = RunStats()
+   samples = []
+   ticks = 0
+   next_sample = sample_interval
+   while ticks < duration:
+      ticks += headless.TICK_STEP
+      world.update_on_time(ticks)
+      stats.observe(world, ticks, headless.TICK_STEP)
+      # the first tick at or past each sample time takes the sample, so
+      # intervals need not be a multiple of the tick step
+      if ticks >= next_sample:
+         samples.append(stats.sample(world, ticks))
+         while next_sample <= ticks:
+            next_sample += sample_interval
+   return samples
+
+
+def parse_grid(specs):
+   axes = []
+   for spec in specs:
+      (name, values) = spec.split('=', 1)
+      if name not in MODULE_PARAMETERS and name != MINER_LIMIT:
+         raise SystemExit('unknown parameter: ' + name)
+      axes.append([(name, int(value)) for value in values.split(',')])
+   return [dict(combo) for combo in itertools.product(*axes)]
+
+
+# Results are one CSV table with a column per run field, parameter and
+# sample value.  The header is written once and each run's samples are
+# appended as it finishes, so a batch costs the same to write at its end
+# as at its start and an interrupted batch keeps the runs that completed.
+def write_header(writer, param_names):
+   writer.writerow(['run', 'seed'] + param_names + SAMPLE_COLUMNS)
+
+
+def write_rows(file, writer, run, seed, params, param_names, samples):
+   for sample in samples:
+      writer.writerow([run, seed] + [params.get(name)
+         for name in param_names] + sample)
+   file.flush()
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Run many headless simulations over a parameter grid '
+      'and write their samples to a CSV table.')
+   parser.add_argument('world', nargs='?', default=headless.WORLD_FILE)
+   parser.add_argument('--param', action='append', default=[],
+      metavar='NAME=V1,V2,...', help='grid axis; repeat for more axes')
+   parser.add_argument('--seeds', type=int, default=DEFAULT_SEEDS)
+   parser.add_argument('--ticks', type=int, default=DEFAULT_DURATION)
+   parser.add_argument('--sample-interval', type=int,
+      default=DEFAULT_SAMPLE_INTERVAL)
+   parser.add_argument('--workers', type=int, default=os.cpu_count())
+   parser.add_argument('--out', default=DEFAULT_OUTPUT)
+   args = parser.parse_args()
+   if args.sample_interval <= 0:
+      parser.error('--sample-interval must be positive')
+
+   grid = parse_grid(args.param)
+   param_names = sorted(set(name for params in grid for name in params))
+
+   with open(args.out, 'w', newline='') as out:
+      writer = csv.writer(out)
+      write_header(writer, param_names)
+      with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+         futures = {}
+         for (run, (params, seed)) in enumerate(
+            itertools.product(grid, range(0, args.seeds))):
+            future = pool.submit(run_simulation, args.world, params, seed,
+               args.ticks, args.sample_interval)
+            futures[future] = (run, params, seed)
+
+         for future in concurrent.futures.as_completed(futures):
+            (run, params, seed) = futures[future]
+            samples = future.result()
+            write_rows(out, writer, run, seed, params, param_names,
+               samples)
+
+            final = dict(zip(SAMPLE_COLUMNS, samples[-1])) if samples else {}
+            print('run %d seed %d %s: smith_resources=%s blobs=%s' % (run,
+               seed, params, final.get('smith_resources'),
+               final.get('blob_count')))
+
+
+if __name__ == '__main__':
+   main()
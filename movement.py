@@ -0,0 +1,46 @@
+import collections
+
+
+# Collects the single-step moves requested during a tick and applies them
+# together.  Each destination tile is reserved by the first entity to ask
+# for it; a reserved move then goes ahead only if its tile is empty or is
+# being vacated by another move that goes ahead, so chains and cycles
+# (including two entities swapping tiles) resolve together, and a blocked
+# move holds up everything queued behind it.
+class MovementPhase:
+   def __init__(self, world):
+      self.world = world
+      self.intents = collections.OrderedDict()
+   def request(self, entity, pt):
+      tiles = []
+      if entity in self.intents:
+         tiles = self.resolve()
+      self.intents[entity] = pt
+      return tiles
+   def pending(self):
+      return len(self.intents)
+   def resolve(self):
+      intents = self.intents
+      self.intents = collections.OrderedDict()
+
+      reserved = set()
+      moves = collections.OrderedDict()
+      for (entity, pt) in intents.items():
+         old_pt = entity.get_position()
+         key = (pt.x, pt.y)
+         if (self.world.within_bounds(pt) and key != (old_pt.x, old_pt.y) and
+            self.world.get_tile_occupant(old_pt) is entity and
+            key not in reserved):
+            reserved.add(key)
+            moves[entity] = pt
+
+      blocked = True
+      while blocked:
+         blocked = False
+         for (entity, pt) in list(moves.items()):
+            occupant = self.world.get_tile_occupant(pt)
+            if occupant is not None and occupant not in moves:
+               del moves[entity]
+               blocked = True
+
+      return self.world.apply_moves(moves)
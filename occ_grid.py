@@ -4,20 +4,61 @@ GATHERER = 1
 GENERATOR = 2
 RESOURCE = 3
 
+MAX_BACKGROUND_KINDS = 256
+
 class Grid:
    def __init__(self, width, height, occupancy_value):
       self.width = width
       self.height = height
-      self.cells = []
-   
       # initialize grid to all specified occupancy value
-      for row in range(0, self.height):
-         self.cells.append([])
-         for col in range(0, self.width):
-            self.cells[row].append(occupancy_value)
+      self.cells = [[occupancy_value] * width for row in range(0, height)]
    def set_cell(self, point, value):
       self.cells[point.y][point.x] = value
    def get_cell(self, point):
       return self.cells[point.y][point.x]
 
 
+# Backgrounds are flyweights: one shared Background per kind (its name and
+# image list) lives in the palette, and each row is a bytearray of palette
+# indices.  Whole rows can then be copied, compared or translated at once.
+class BackgroundGrid:
+   def __init__(self, width, height, background):
+      self.width = width
+      self.height = height
+      self.palette = []
+      self.kinds = {}
+      default = self.intern(background)
+      self.rows = [bytearray([default]) * width for row in range(0, height)]
+   def find(self, name, imgs):
+      return self.kinds.get((name, id(imgs)))
+   def intern(self, background):
+      key = (background.get_name(), id(background.get_images()))
+      index = self.kinds.get(key)
+      if index is None:
+         if len(self.palette) == MAX_BACKGROUND_KINDS:
+            raise ValueError('more than ' + str(MAX_BACKGROUND_KINDS) +
+               ' kinds of background')
+         index = self.kinds[key] = len(self.palette)
+         self.palette.append(background)
+      return index
+   def set_cell(self, point, value):
+      self.rows[point.y][point.x] = self.intern(value)
+   def get_cell(self, point):
+      return self.palette[self.rows[point.y][point.x]]
+   def get_row(self, y):
+      return [self.palette[index] for index in self.rows[y]]
+
+
+# Keeps one bitset per row (bit x set when the cell holds an occupant) so
+# that the spatial index's free-cell searches take a few integer operations
+# per row.
+class OccupancyGrid(Grid):
+   def __init__(self, width, height):
+      Grid.__init__(self, width, height, None)
+      self.occupied_rows = [0] * height
+   def set_cell(self, point, value):
+      self.cells[point.y][point.x] = value
+      if value is None:
+         self.occupied_rows[point.y] &= ~(1 << point.x)
+      else:
+         self.occupied_rows[point.y] |= 1 << point.x
@@ -1,34 +1,77 @@
+import heapq
+
+
+# Entries are kept in a heap keyed on (ord, -insertion count), which pops
+# items in the same order as the original sorted-list insert: by ord, and
+# most recently inserted first among equal ords.  Removed entries are
+# blanked in place and skipped when they reach the top.
 class OrderedList:
    def __init__(self):
       self.list = []
+      self.entries = {}
+      self.count = 0
+      self.live = 0
+      self.bulk = False
 
 
    def insert(self, item, ord):
-      size = len(self.list)
-      idx = 0
-      while (idx < size and self.list[idx].ord < ord):
-         idx += 1
-
-      self.list[idx:idx] = [ListItem(item, ord)]
+      self.count += 1
+      entry = [ord, -self.count, ListItem(item, ord)]
+      self.entries.setdefault(item, []).append(entry)
+      self.live += 1
+      if self.bulk:
+         self.list.append(entry)
+      else:
+         heapq.heappush(self.list, entry)
 
 
    def remove(self, item):
-      size = len(self.list)
-      idx = 0
-      while (idx < size and self.list[idx].item != item):
-         idx += 1
-
-      if idx < size:
-         self.list[idx:idx+1] = []
+      entries = self.entries.get(item)
+      if entries:
+         entry = min(entries)
+         entries.remove(entry)
+         if not entries:
+            del self.entries[item]
+         entry[2] = None
+         self.live -= 1
 
 
    def head(self):
-      return self.list[0] if self.list else None
+      self.end_bulk()
+      while self.list and self.list[0][2] is None:
+         heapq.heappop(self.list)
+      return self.list[0][2] if self.list else None
 
 
    def pop(self):
-      if self.list:
-         return self.list.pop(0)
+      list_item = self.head()
+      if list_item:
+         entry = heapq.heappop(self.list)
+         entries = self.entries[list_item.item]
+         entries.remove(entry)
+         if not entries:
+            del self.entries[list_item.item]
+         self.live -= 1
+         return list_item
+
+
+   def size(self):
+      return self.live
+
+
+   def items(self):
+      return [(entry[0], entry[2].item) for entry in sorted(self.list)
+         if entry[2] is not None]
+
+
+   def begin_bulk(self):
+      self.bulk = True
+
+
+   def end_bulk(self):
+      if self.bulk:
+         heapq.heapify(self.list)
+         self.bulk = False
 
 
 class ListItem:
@@ -0,0 +1,266 @@
+import collections
+import entities
+import events
+import heapq
+import point
+
+CLUSTER_SIZE = 10
+ENTRANCE_SPLIT = 6
+GOAL_CACHE_SIZE = 64
+SEARCH_LIMIT = 4096
+
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+# Hierarchical path planner over the entities that never move.  The world
+# is cut into square clusters; each free run of cells along a shared
+# cluster border gives one or two crossings, and the crossing cells of a
+# cluster are joined by their walking distance inside it.  A query searches
+# only the start and goal clusters cell by cell and the crossing graph in
+# between, so its cost follows the length of the path rather than the size
+# of the map; searches that give up after SEARCH_LIMIT crossings return
+# None and the caller falls back to its greedy step.  Clusters are built
+# the first time a query reaches them, and adding or removing a static
+# entity marks its cluster (and the neighbour across any border the cell
+# sits on) to be rebuilt the same way.
+class Pathfinder:
+   def __init__(self, world, cluster_size=CLUSTER_SIZE):
+      self.world = world
+      self.size = cluster_size
+      self.cols = (world.num_cols + cluster_size - 1) // cluster_size
+      self.rows = (world.num_rows + cluster_size - 1) // cluster_size
+      self.blocked = set()
+      self.borders = {}
+      self.crossings = collections.defaultdict(list)
+      self.nodes = {}
+      self.edges = {}
+      self.goal_cache = {}
+      for entity in world.get_entities():
+         if is_static(entity):
+            pt = entity.get_position()
+            self.blocked.add((pt.x, pt.y))
+      self.dirty = set()
+      self.stale_borders = set()
+      for cx in range(self.cols):
+         for cy in range(self.rows):
+            self.dirty.add((cx, cy))
+            for other in self.neighbor_clusters((cx, cy)):
+               self.stale_borders.add(border_key((cx, cy), other))
+      world.events.subscribe(events.EntityAdded, self.entity_added)
+      world.events.subscribe(events.EntityRemoved, self.entity_removed)
+   def entity_added(self, event):
+      if is_static(event.entity):
+         pt = event.entity.get_position()
+         self.blocked.add((pt.x, pt.y))
+         self.mark((pt.x, pt.y))
+   def entity_removed(self, event):
+      if is_static(event.entity):
+         self.blocked.discard((event.pt.x, event.pt.y))
+         self.mark((event.pt.x, event.pt.y))
+   def mark(self, cell):
+      cluster = self.cluster_of(cell)
+      self.dirty.add(cluster)
+      for other in self.neighbor_clusters(cluster):
+         if self.cluster_of((cell[0] + other[0] - cluster[0],
+            cell[1] + other[1] - cluster[1])) == other:
+            self.dirty.add(other)
+            self.stale_borders.add(border_key(cluster, other))
+      self.goal_cache.clear()
+   def cluster_of(self, cell):
+      return (cell[0] // self.size, cell[1] // self.size)
+   def cluster_bounds(self, cluster):
+      left = cluster[0] * self.size
+      top = cluster[1] * self.size
+      return (left, top, min(left + self.size, self.world.num_cols),
+         min(top + self.size, self.world.num_rows))
+   def neighbor_clusters(self, cluster):
+      for (dx, dy) in STEPS:
+         (cx, cy) = (cluster[0] + dx, cluster[1] + dy)
+         if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            yield (cx, cy)
+   def refresh(self):
+      for cluster in list(self.dirty):
+         self.ensure(cluster)
+   def ensure(self, cluster):
+      if cluster in self.dirty:
+         for other in self.neighbor_clusters(cluster):
+            border = border_key(cluster, other)
+            if border in self.stale_borders:
+               self.build_border(border)
+               self.stale_borders.discard(border)
+         self.build_cluster(cluster)
+         self.dirty.discard(cluster)
+   def build_border(self, border):
+      for (a, b) in self.borders.get(border, []):
+         self.crossings[a].remove(b)
+         self.crossings[b].remove(a)
+
+      (first, second) = border
+      (left, top, right, bottom) = self.cluster_bounds(first)
+      if first[0] != second[0]:
+         cells = [((right - 1, y), (right, y)) for y in range(top, bottom)]
+      else:
+         cells = [((x, bottom - 1), (x, bottom)) for x in range(left, right)]
+
+      pairs = []
+      run = []
+      for pair in cells + [None]:
+         if (pair and pair[0] not in self.blocked and
+            pair[1] not in self.blocked):
+            run.append(pair)
+         elif run:
+            if len(run) < ENTRANCE_SPLIT:
+               pairs.append(run[len(run) // 2])
+            else:
+               pairs.extend([run[0], run[-1]])
+            run = []
+
+      self.borders[border] = pairs
+      for (a, b) in pairs:
+         self.crossings[a].append(b)
+         self.crossings[b].append(a)
+   def build_cluster(self, cluster):
+      nodes = set()
+      for other in self.neighbor_clusters(cluster):
+         border = border_key(cluster, other)
+         side = 0 if cluster == border[0] else 1
+         for pair in self.borders.get(border, []):
+            nodes.add(pair[side])
+
+      for node in self.nodes.get(cluster, ()):
+         self.edges.pop(node, None)
+      self.nodes[cluster] = nodes
+      for node in nodes:
+         (dist, parents) = self.search_cluster(node, cluster)
+         self.edges[node] = [(other, dist[other]) for other in nodes
+            if other != node and other in dist]
+   def search_cluster(self, source, cluster, target=None):
+      (left, top, right, bottom) = self.cluster_bounds(cluster)
+      dist = {source: 0}
+      parents = {}
+      frontier = collections.deque([source])
+      while frontier:
+         cell = frontier.popleft()
+         for (dx, dy) in STEPS:
+            (x, y) = adjacent = (cell[0] + dx, cell[1] + dy)
+            if (left <= x < right and top <= y < bottom and
+               adjacent not in dist and
+               (adjacent not in self.blocked or adjacent == target)):
+               dist[adjacent] = dist[cell] + 1
+               parents[adjacent] = cell
+               if adjacent != target:
+                  frontier.append(adjacent)
+      return (dist, parents)
+   def goal_distances(self, goal):
+      dist = self.goal_cache.get(goal)
+      if dist is None:
+         dist = {}
+         sources = [(cell, 1) for cell in self.open_neighbors(goal)]
+         if goal not in self.blocked:
+            sources.append((goal, 0))
+         for (source, offset) in sources:
+            cluster = self.cluster_of(source)
+            self.ensure(cluster)
+            (reached, parents) = self.search_cluster(source, cluster)
+            for node in self.nodes[cluster]:
+               if node in reached and (node not in dist or
+                  reached[node] + offset < dist[node]):
+                  dist[node] = reached[node] + offset
+         if len(self.goal_cache) >= GOAL_CACHE_SIZE:
+            self.goal_cache.clear()
+         self.goal_cache[goal] = dist
+      return dist
+   def open_neighbors(self, cell):
+      for (dx, dy) in STEPS:
+         (x, y) = adjacent = (cell[0] + dx, cell[1] + dy)
+         if (0 <= x < self.world.num_cols and 0 <= y < self.world.num_rows and
+            adjacent not in self.blocked):
+            yield adjacent
+   def next_step(self, start_pt, goal_pt):
+      start = (start_pt.x, start_pt.y)
+      goal = (goal_pt.x, goal_pt.y)
+      if manhattan(start, goal) <= 1:
+         return goal_pt
+
+      cluster = self.cluster_of(start)
+      self.ensure(cluster)
+      (dist, parents) = self.search_cluster(start, cluster, goal)
+      if goal in dist:
+         return point.Point(*first_step(start, goal, parents))
+
+      start_dist = dict((node, dist[node]) for node in self.nodes[cluster]
+         if node in dist)
+      direct = [dist[cell] + 1 for cell in self.open_neighbors(goal)
+         if cell in dist]
+      if direct:
+         start_dist[goal] = min(direct)
+      path = self.search_abstract(start_dist, goal,
+         self.goal_distances(goal))
+      for node in path:
+         if node == goal:
+            node = min((dist[cell], cell)
+               for cell in self.open_neighbors(goal) if cell in dist)[1]
+         if node == start:
+            continue
+         elif node in parents:
+            return point.Point(*first_step(start, node, parents))
+         else:
+            return point.Point(*node)
+      return None
+   def search_abstract(self, start_dist, goal, goal_dist):
+      best = {}
+      parents = {}
+      frontier = []
+      for (node, cost) in start_dist.items():
+         best[node] = cost
+         parents[node] = None
+         heapq.heappush(frontier, (cost + manhattan(node, goal), cost, node))
+
+      expanded = 0
+      while frontier and expanded < SEARCH_LIMIT:
+         (estimate, cost, node) = heapq.heappop(frontier)
+         if node == goal:
+            path = []
+            while node is not None:
+               path.append(node)
+               node = parents[node]
+            path.reverse()
+            return path
+         if cost > best[node]:
+            continue
+
+         expanded += 1
+         self.ensure(self.cluster_of(node))
+
+         moves = [(other, 1) for other in self.crossings.get(node, ())]
+         moves.extend(self.edges.get(node, ()))
+         if node in goal_dist:
+            moves.append((goal, goal_dist[node]))
+         for (other, step) in moves:
+            total = cost + step
+            if total < best.get(other, total + 1):
+               best[other] = total
+               parents[other] = node
+               heapq.heappush(frontier,
+                  (total + manhattan(other, goal), total, other))
+      return []
+
+
+def is_static(entity):
+   return isinstance(entity,
+      (entities.Obstacle, entities.Blacksmith, entities.Vein))
+
+
+def border_key(cluster, other):
+   return (min(cluster, other), max(cluster, other))
+
+
+def manhattan(a, b):
+   return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def first_step(start, target, parents):
+   cell = target
+   while parents[cell] != start:
+      cell = parents[cell]
+   return cell
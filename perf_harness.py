@@ -0,0 +1,261 @@
+import argparse
+import entities
+import gc
+import headless
+import io
+import json
+import actions
+import ordered_list
+import point
+import random
+import save_load
+import sys
+import time
+import worldmodel
+
+BASELINE_FILE = 'perf_baseline.json'
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEATS = 7
+
+SEED = 1
+SCHEDULER_ITEMS = 100000
+QUERY_COUNT = 20000
+OPEN_DISTANCES = [1, 4]
+SAVE_LOAD_ROUNDS = 20
+SIMULATION_TICKS = 600000
+CALIBRATION_ITERATIONS = 300000
+
+
+def load_gaia(run=False):
+   (world, i_store) = headless.create_world(headless.WORLD_FILE, run=run)
+   return (world, i_store)
+
+
+def random_points(world, count):
+   rng = random.Random(SEED)
+   return [point.Point(rng.randrange(world.num_cols),
+      rng.randrange(world.num_rows)) for i in range(count)]
+
+
+def setup_scheduler(world, i_store):
+   rng = random.Random(SEED)
+   ords = [rng.randrange(SCHEDULER_ITEMS * 10) for i in range(SCHEDULER_ITEMS)]
+   items = [object() for i in range(SCHEDULER_ITEMS)]
+
+   def run():
+      queue = ordered_list.OrderedList()
+      for (item, ord) in zip(items, ords):
+         queue.insert(item, ord)
+      for item in items[::3]:
+         queue.remove(item)
+      while queue.head():
+         queue.pop()
+   return run
+
+
+def setup_find_nearest(world, i_store):
+   pts = random_points(world, QUERY_COUNT)
+   types = [entities.Ore, entities.Blacksmith, entities.Vein]
+
+   def run():
+      for pt in pts:
+         for type in types:
+            world.find_nearest(pt, type)
+   return run
+
+
+def setup_next_position(world, i_store):
+   pts = random_points(world, QUERY_COUNT * 2)
+   pairs = list(zip(pts[::2], pts[1::2]))
+
+   def run():
+      for (src, dest) in pairs:
+         actions.next_position(world, src, dest)
+         actions.blob_next_position(world, src, dest)
+   return run
+
+
+def setup_find_open_around(world, i_store):
+   pts = random_points(world, QUERY_COUNT)
+
+   def run():
+      for pt in pts:
+         for distance in OPEN_DISTANCES:
+            actions.find_open_around(world, pt, distance)
+   return run
+
+
+def setup_save_load(world, i_store):
+   def run():
+      for i in range(SAVE_LOAD_ROUNDS):
+         out = io.StringIO()
+         save_load.save_world(world, out)
+         loaded = worldmodel.WorldModel(world.num_rows, world.num_cols,
+            world.get_background(point.Point(0, 0)))
+         out.seek(0)
+         save_load.load_world_bulk(loaded, i_store, out)
+   return run
+
+
+def setup_simulation(world, i_store):
+   random.seed(SEED)
+   (world, i_store) = load_gaia(run=True)
+
+   def run():
+      headless.run(world, SIMULATION_TICKS)
+   return run
+
+
+# Plain interpreter work timed in the same run as the benchmarks; results
+# are stored as multiples of it so a baseline written on one machine still
+# means something on a faster or slower one.
+def setup_calibration(world, i_store):
+   def run():
+      table = {}
+      total = 0
+      for i in range(CALIBRATION_ITERATIONS):
+         key = (i % 97, i % 89)
+         table[key] = table.get(key, 0) + i
+         total += len(table)
+      return total
+   return run
+
+
+BENCHMARKS = [
+   ('scheduler', setup_scheduler),
+   ('find_nearest', setup_find_nearest),
+   ('next_position', setup_next_position),
+   ('find_open_around', setup_find_open_around),
+   ('save_load', setup_save_load),
+   ('simulation', setup_simulation),
+]
+
+
+def measure(setup, world, i_store, repeats):
+   best = None
+   for i in range(repeats):
+      run = setup(world, i_store)
+      gc.collect()
+      enabled = gc.isenabled()
+      gc.disable()
+      try:
+         start = time.process_time()
+         run()
+         elapsed = time.process_time() - start
+      finally:
+         if enabled:
+            gc.enable()
+      if best is None or elapsed < best:
+         best = elapsed
+   return best
+
+
+def run_benchmarks(names, repeats):
+   (world, i_store) = load_gaia()
+   # the calibration is retimed between benchmarks and its fastest run kept,
+   # so one slow moment on a busy machine does not skew every ratio
+   calibration = measure(setup_calibration, world, i_store, repeats)
+   seconds = {}
+   for (name, setup) in BENCHMARKS:
+      if not names or name in names:
+         seconds[name] = measure(setup, world, i_store, repeats)
+         calibration = min(calibration,
+            measure(setup_calibration, world, i_store, repeats))
+   results = dict((name, elapsed / calibration)
+      for (name, elapsed) in seconds.items())
+   return (results, calibration)
+
+
+def load_baseline(path):
+   try:
+      with open(path, 'r') as file:
+         return json.load(file)
+   except IOError:
+      return {}
+
+
+def save_baseline(path, baseline):
+   with open(path, 'w') as file:
+      json.dump(baseline, file, indent=2, sort_keys=True)
+      file.write('\n')
+
+
+def compare(results, baseline, threshold):
+   rows = []
+   regressions = []
+   for (name, setup) in BENCHMARKS:
+      if name not in results:
+         continue
+      current = results[name]
+      base = baseline.get(name)
+      if base is None:
+         rows.append((name, '-', current, '-', 'new'))
+         continue
+      change = (current - base) / base if base else 0.0
+      status = 'ok'
+      if change > threshold:
+         status = 'REGRESSED'
+         regressions.append(name)
+      elif change < -threshold:
+         status = 'faster'
+      rows.append((name, base, current, change, status))
+   return (rows, regressions)
+
+
+def format_ratio(value):
+   if value == '-':
+      return value
+   return '%.3fx' % value
+
+
+def format_report(rows, threshold, calibration):
+   lines = ['%-18s %10s %10s %8s  %s' % ('benchmark', 'baseline', 'current',
+      'change', 'status')]
+   for (name, base, current, change, status) in rows:
+      if change != '-':
+         change = '%+.1f%%' % (change * 100)
+      lines.append('%-18s %10s %10s %8s  %s' % (name, format_ratio(base),
+         format_ratio(current), change, status))
+   lines.append('times are multiples of a %.4fs calibration loop' %
+      calibration)
+   lines.append('threshold +%.0f%% cpu time' % (threshold * 100))
+   return '\n'.join(lines)
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Time core operations and compare against stored baselines.')
+   parser.add_argument('benchmarks', nargs='*',
+      help='benchmarks to run (default: all)')
+   parser.add_argument('--baseline', default=BASELINE_FILE)
+   parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+      help='allowed slowdown as a fraction of the baseline')
+   parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+      help='runs per benchmark; the fastest is kept')
+   parser.add_argument('--update', action='store_true',
+      help='store these results as the new baseline')
+   args = parser.parse_args()
+
+   known = [name for (name, setup) in BENCHMARKS]
+   unknown = [name for name in args.benchmarks if name not in known]
+   if unknown:
+      parser.error('unknown benchmark: ' + ', '.join(unknown) +
+         ' (choose from ' + ', '.join(known) + ')')
+
+   (results, calibration) = run_benchmarks(args.benchmarks, args.repeats)
+   baseline = load_baseline(args.baseline)
+   (rows, regressions) = compare(results, baseline, args.threshold)
+   print(format_report(rows, args.threshold, calibration))
+
+   if args.update:
+      baseline.update((name, round(ratio, 4))
+         for (name, ratio) in results.items())
+      save_baseline(args.baseline, baseline)
+      print('baseline written to ' + args.baseline)
+   elif regressions:
+      print('regressed: ' + ', '.join(regressions))
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,79 @@
+import argparse
+import image_store
+import pygame
+import tile_stream
+
+IMAGE_LIST_FILE_NAME = 'imagelist'
+
+TILE_WIDTH = 16
+TILE_HEIGHT = 16
+SOURCE_TILE_WIDTH = 32
+SOURCE_TILE_HEIGHT = 32
+
+
+def load_tile_images(reader, tile_width, tile_height):
+   i_store = image_store.load_images(IMAGE_LIST_FILE_NAME,
+      SOURCE_TILE_WIDTH, SOURCE_TILE_HEIGHT)
+   images = []
+   for (key, index) in reader.image_table:
+      imgs = image_store.get_images(i_store, key)
+      img = imgs[min(index, len(imgs) - 1)]
+      images.append(pygame.transform.scale(img, (tile_width, tile_height)))
+   return images
+
+
+def draw_tiles(screen, images, tiles, tile_width, tile_height):
+   blits = []
+   rects = []
+   for (x, y, bgnd, occ) in tiles:
+      dest = (x * tile_width, y * tile_height)
+      if bgnd != tile_stream.NO_IMAGE:
+         blits.append((images[bgnd], dest))
+      if occ != tile_stream.NO_IMAGE:
+         blits.append((images[occ], dest))
+      rects.append(pygame.Rect(dest[0], dest[1], tile_width, tile_height))
+   screen.blits(blits, False)
+   return rects
+
+
+def replay(reader, screen, images, speed, tile_width, tile_height):
+   clock_start = None
+   for (kind, ticks, tiles) in reader.frames():
+      for event in pygame.event.get():
+         if event.type == pygame.QUIT:
+            return
+
+      if speed > 0:
+         if clock_start is None:
+            clock_start = pygame.time.get_ticks() - ticks / speed
+         wait = clock_start + ticks / speed - pygame.time.get_ticks()
+         if wait > 0:
+            pygame.time.wait(int(wait))
+
+      rects = draw_tiles(screen, images, tiles, tile_width, tile_height)
+      if kind == tile_stream.KEYFRAME:
+         pygame.display.update()
+      else:
+         pygame.display.update(rects)
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Replay a recorded tile stream without the simulation.')
+   parser.add_argument('source',
+      help='stream file, or unix:PATH to wait for a live game')
+   parser.add_argument('--speed', type=float, default=1.0,
+      help='playback speed relative to recorded time (0 plays unpaced)')
+   args = parser.parse_args()
+
+   with tile_stream.open_input(args.source) as inp:
+      reader = tile_stream.TileStreamReader(inp)
+      pygame.init()
+      screen = pygame.display.set_mode((reader.num_cols * TILE_WIDTH,
+         reader.num_rows * TILE_HEIGHT))
+      images = load_tile_images(reader, TILE_WIDTH, TILE_HEIGHT)
+      replay(reader, screen, images, args.speed, TILE_WIDTH, TILE_HEIGHT)
+
+
+if __name__ == '__main__':
+   main()
@@ -1,8 +1,9 @@
-import actions
 import entities
+import events
+import gc
 import image_store
 import point
-import worldmodel
+import time
 
 PROPERTY_KEY = 0
 
@@ -51,23 +52,50 @@ VEIN_COL = 2
 VEIN_ROW = 3
 VEIN_REACH = 5
 
+UNKNOWN_KEY = 'unknown'
+
+MAX_REPORTED_ERRORS = 20
+
+# key -> (exact property count, or None for a minimum, column index, row index)
+LINE_FORMATS = {BGND_KEY : (None, BGND_COL, BGND_ROW),
+                MINER_KEY : (MINER_NUM_PROPERTIES, MINER_COL, MINER_ROW),
+                OBSTACLE_KEY : (OBSTACLE_NUM_PROPERTIES, OBSTACLE_COL,
+                   OBSTACLE_ROW),
+                ORE_KEY : (ORE_NUM_PROPERTIES, ORE_COL, ORE_ROW),
+                SMITH_KEY : (SMITH_NUM_PROPERTIES, SMITH_COL, SMITH_ROW),
+                VEIN_KEY : (VEIN_NUM_PROPERTIES, VEIN_COL, VEIN_ROW)
+                }
+
+class WorldFileError(Exception):
+   def __init__(self, errors):
+      shown = errors[:MAX_REPORTED_ERRORS]
+      if len(errors) > len(shown):
+         shown.append('... and ' + str(len(errors) - len(shown)) +
+            ' more errors')
+      super(WorldFileError, self).__init__('\n'.join(shown))
+      self.errors = errors
+
 def save_world(world, file):
    save_entities(world, file)
    save_background(world, file)
 
 def save_entities(world, file):
-   for entity in worldmodel.get_entities(world):
+   for entity in world.get_entities():
       file.write(entity.entity_string() + '\n')
 
+# Writes a row at a time from the palette indices, formatting each kind's
+# name and each column number once.
 def save_background(world, file):
+   grid = world.background
+   prefixes = ['background ' + bgnd.get_name() + ' ' for bgnd in grid.palette]
+   cols = [str(col) + ' ' for col in range(0, world.num_cols)]
    for row in range(0, world.num_rows):
-      for col in range(0, world.num_cols):
-         entity = worldmodel.get_background(point.Point(col, row))
-         file.write('background ' +
-            entity.get_name() +
-            ' ' + str(col) + ' ' + str(row) + '\n')      
+      suffix = str(row) + '\n'
+      file.write(''.join([prefixes[index] + col + suffix
+         for (index, col) in zip(grid.rows[row], cols)]))
 
 def load_world(world, images, file, run=False):
+   world.i_store = images
    for line in file:
       properties = line.split()
       if properties:
@@ -76,12 +104,156 @@ def load_world(world, images, file, run=False):
          else:
             add_entity(world, properties, images, run)
 
+# The cyclic collector is paused while the parsed records are alive: they
+# are all acyclic, and repeated full collections over millions of fresh
+# lists otherwise dominate the load time.
+def load_world_bulk(world, i_store, file, run=False):
+   gc_was_enabled = gc.isenabled()
+   gc.disable()
+   try:
+      return load_world_phases(world, i_store, file, run)
+   finally:
+      if gc_was_enabled:
+         gc.enable()
+
+
+def load_world_phases(world, i_store, file, run):
+   timings = []
+   start = time.perf_counter()
+
+   lines = file.readlines()
+   start = record_phase(timings, 'read', start)
+
+   (records, errors) = parse_lines(lines, 1)
+   start = record_phase(timings, 'parse', start)
+
+   errors.extend(validate_records(world, records))
+   if errors:
+      raise WorldFileError(errors)
+   start = record_phase(timings, 'validate', start)
+
+   world.i_store = i_store
+   new_entities = build_world(world, records, i_store)
+   start = record_phase(timings, 'build', start)
+
+   if run:
+      world.action_queue.begin_bulk()
+      for entity in new_entities:
+         world.schedule_entity(entity, i_store)
+      world.action_queue.end_bulk()
+   record_phase(timings, 'schedule', start)
+
+   return timings
+
+
+def record_phase(timings, name, start):
+   now = time.perf_counter()
+   timings.append((name, now - start))
+   return now
+
+
+def format_timings(timings):
+   return ' '.join('%s=%.1fms' % (name, seconds * 1000)
+      for (name, seconds) in timings)
+
+
+def parse_lines(lines, first_line):
+   records = []
+   errors = []
+   for (line_number, line) in enumerate(lines, first_line):
+      properties = line.split()
+      if not properties or properties[PROPERTY_KEY] == UNKNOWN_KEY:
+         continue
+      if (properties[PROPERTY_KEY] == BGND_KEY and
+         len(properties) >= BGND_NUM_PROPERTIES and
+         properties[BGND_COL].isdigit() and properties[BGND_ROW].isdigit()):
+         # background lines dominate large files; skip the general checks
+         properties[BGND_COL] = int(properties[BGND_COL])
+         properties[BGND_ROW] = int(properties[BGND_ROW])
+         records.append((line_number, properties))
+         continue
+      error = parse_properties(properties)
+      if error:
+         errors.append('line ' + str(line_number) + ': ' + error)
+      else:
+         records.append((line_number, properties))
+   return (records, errors)
+
+
+# Converts the numeric fields to int in place so the create_* functions
+# below can consume the properties unchanged.
+def parse_properties(properties):
+   line_format = LINE_FORMATS.get(properties[PROPERTY_KEY])
+   if line_format is None:
+      return 'unknown entry type ' + repr(properties[PROPERTY_KEY])
+   count = line_format[0]
+   if count is None:
+      if len(properties) < BGND_NUM_PROPERTIES:
+         return (properties[PROPERTY_KEY] + ' needs at least ' +
+            str(BGND_NUM_PROPERTIES) + ' fields, found ' +
+            str(len(properties)))
+      count = BGND_NUM_PROPERTIES
+   elif len(properties) != count:
+      return (properties[PROPERTY_KEY] + ' needs ' + str(count) +
+         ' fields, found ' + str(len(properties)))
+   try:
+      properties[2:count] = [int(field) for field in properties[2:count]]
+   except ValueError:
+      for i in range(2, count):
+         if not properties[i].lstrip('+-').isdigit():
+            return ('field ' + str(i + 1) + ' is not an integer: ' +
+               properties[i])
+      return 'fields are not all integers'
+   return None
+
+
+def validate_records(world, records):
+   errors = []
+   for (line_number, properties) in records:
+      (count, col, row) = LINE_FORMATS[properties[PROPERTY_KEY]]
+      if not (0 <= properties[col] < world.num_cols and
+         0 <= properties[row] < world.num_rows):
+         errors.append('line ' + str(line_number) + ': position ' +
+            str(properties[col]) + ' ' + str(properties[row]) +
+            ' is outside the ' + str(world.num_cols) + 'x' +
+            str(world.num_rows) + ' world')
+   return errors
+
+
+# Background records go straight into the grid's rows as palette indices
+# unless someone is listening for background changes.
+def build_world(world, records, i_store):
+   new_entities = []
+   kinds = {}
+   rows = world.background.rows
+   direct = not world.events.wants(events.BackgroundChanged)
+   for (line_number, properties) in records:
+      if properties[PROPERTY_KEY] == BGND_KEY:
+         name = properties[BGND_NAME]
+         index = kinds.get(name)
+         if index is None:
+            index = kinds[name] = world.background.intern(
+               world.get_background_kind(name,
+                  image_store.get_images(i_store, name)))
+         if direct:
+            rows[properties[BGND_ROW]][properties[BGND_COL]] = index
+         else:
+            world.set_background(
+               point.Point(properties[BGND_COL], properties[BGND_ROW]),
+               world.background.palette[index])
+      else:
+         entity = create_from_properties(properties, i_store)
+         world.add_entity(entity)
+         new_entities.append(entity)
+   return new_entities
+
+
 def add_background(world, properties, i_store):
    if len(properties) >= BGND_NUM_PROPERTIES:
       pt = point.Point(int(properties[BGND_COL]), int(properties[BGND_ROW]))
       name = properties[BGND_NAME]
-      world.set_background(pt,
-         entities.Background(name, image_store.get_images(i_store, name)))
+      world.set_background(pt, world.get_background_kind(name,
+         image_store.get_images(i_store, name)))
 
 def add_entity(world, properties, i_store, run):
    new_entity = create_from_properties(properties, i_store)
@@ -148,7 +320,6 @@ def create_blacksmith(properties, i_store):
          image_store.get_images(i_store, properties[PROPERTY_KEY]),
          int(properties[SMITH_LIMIT]), int(properties[SMITH_RATE]),
          int(properties[SMITH_REACH]))
-      return smith
    else:
       return None
 
@@ -0,0 +1,38 @@
+DEFAULT_STEP = 100
+
+
+class SimClock:
+   def __init__(self, ticks=0, speed=1.0, step=DEFAULT_STEP):
+      self.ticks = ticks
+      self.speed = speed
+      self.step_size = step
+      self.paused = False
+      self.pending_steps = 0
+      self.remainder = 0.0
+   def get_ticks(self):
+      return self.ticks
+   def get_speed(self):
+      return self.speed
+   def set_speed(self, speed):
+      self.speed = max(speed, 0.0)
+   def is_paused(self):
+      return self.paused
+   def pause(self):
+      self.paused = True
+   def resume(self):
+      self.paused = False
+      self.pending_steps = 0
+   def step(self, count=1):
+      self.paused = True
+      self.pending_steps += count
+   def advance(self, elapsed):
+      if self.paused:
+         if self.pending_steps > 0:
+            self.pending_steps -= 1
+            self.ticks += self.step_size
+      else:
+         scaled = elapsed * self.speed + self.remainder
+         whole = int(scaled)
+         self.remainder = scaled - whole
+         self.ticks += whole
+      return self.ticks
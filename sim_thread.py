@@ -0,0 +1,160 @@
+import collections
+import events
+import point
+import threading
+import time
+
+class Occupant(collections.namedtuple('Occupant', 'position image kind')):
+   __slots__ = ()
+   def get_position(self):
+      return self.position
+   def get_image(self):
+      return self.image
+   def get_kind(self):
+      return self.kind
+
+
+# The part of the world the display reads, kept on the render side.  It is
+# only ever touched by the thread that draws: frames taken from the
+# simulation thread are applied here and the changed tiles handed to the
+# view, so drawing never looks at entities the simulation is moving.
+class WorldMirror:
+   def __init__(self, world):
+      self.num_rows = world.num_rows
+      self.num_cols = world.num_cols
+      self.events = events.EventBus()
+      self.background = [world.background.get_row(y)
+         for y in range(0, world.num_rows)]
+      self.occupants = {}
+      for (y, row) in enumerate(world.occupancy.cells):
+         for (x, entity) in enumerate(row):
+            if entity is not None:
+               self.occupants[(x, y)] = snapshot_occupant(entity,
+                  point.Point(x, y))
+   def apply(self, frame):
+      tiles = []
+      for ((x, y), (bgnd, occupant)) in frame.items():
+         pt = point.Point(x, y)
+         old_bgnd = self.background[y][x]
+         if bgnd is not old_bgnd:
+            self.background[y][x] = bgnd
+            if self.events.wants(events.BackgroundChanged):
+               self.events.publish(events.BackgroundChanged(pt, old_bgnd,
+                  bgnd))
+         if occupant:
+            self.occupants[(x, y)] = occupant
+         else:
+            self.occupants.pop((x, y), None)
+         tiles.append(pt)
+      return tiles
+   @property
+   def entities(self):
+      return list(self.occupants.values())
+   def within_bounds(self, pt):
+      return (pt.x >= 0 and pt.x < self.num_cols and
+         pt.y >= 0 and pt.y < self.num_rows)
+   def is_occupied(self, pt):
+      return (self.within_bounds(pt) and
+         (pt.x, pt.y) in self.occupants)
+   def get_tile_occupant(self, pt):
+      return self.occupants.get((pt.x, pt.y))
+   def get_background(self, pt):
+      if self.within_bounds(pt):
+         return self.background[pt.y][pt.x]
+   def get_background_image(self, pt):
+      if self.within_bounds(pt):
+         return self.background[pt.y][pt.x].get_image()
+
+
+# Runs update_on_time on its own thread, paced by wall time rather than by
+# the display's timer.  After every step the tiles it changed (whether
+# reported by the actions or seen through the world's events) are copied
+# into immutable (background, occupant) pairs and merged into the back
+# buffer; take() swaps that buffer out under the lock, so the renderer
+# always gets a consistent frame and never waits for a slow step.
+class SimulationThread(threading.Thread):
+   def __init__(self, world, clock, server=None, recorder=None):
+      super(SimulationThread, self).__init__()
+      self.daemon = True
+      self.world = world
+      self.clock = clock
+      self.server = server
+      self.recorder = recorder
+      self.lock = threading.Lock()
+      self.back = {}
+      self.changed = set()
+      self.view_rect = None
+      self.running = True
+      world.events.subscribe(events.EntityAdded, self.entity_added)
+      world.events.subscribe(events.EntityMoved, self.entity_moved)
+      world.events.subscribe(events.EntityRemoved, self.entity_removed)
+      world.events.subscribe(events.BackgroundChanged,
+         self.background_changed)
+   def entity_added(self, event):
+      pt = event.entity.get_position()
+      self.changed.add((pt.x, pt.y))
+   def entity_moved(self, event):
+      self.changed.add((event.old_pt.x, event.old_pt.y))
+      self.changed.add((event.new_pt.x, event.new_pt.y))
+   def entity_removed(self, event):
+      self.changed.add((event.pt.x, event.pt.y))
+   def background_changed(self, event):
+      self.changed.add((event.pt.x, event.pt.y))
+   def run(self):
+      step = self.clock.step_size / 1000.0
+      last = time.monotonic()
+      deadline = last
+      while self.running:
+         deadline += step
+         delay = deadline - time.monotonic()
+         if delay > 0:
+            time.sleep(delay)
+         else:
+            deadline = time.monotonic()
+
+         if self.server:
+            self.server.poll(self.world, self.clock)
+         now = time.monotonic()
+         before = self.clock.get_ticks()
+         ticks = self.clock.advance((now - last) * 1000)
+         last = now
+         if ticks != before:
+            tiles = []
+            if self.world.lod and self.view_rect:
+               tiles = self.world.lod.set_view(self.view_rect, before)
+            tiles.extend(self.world.update_on_time(ticks))
+            if self.recorder:
+               self.recorder.write_frame(ticks, tiles)
+            self.publish(tiles)
+   def publish(self, tiles):
+      changed = self.changed
+      self.changed = set()
+      for pt in tiles:
+         changed.add((pt.x, pt.y))
+      frame = {}
+      for (x, y) in changed:
+         pt = point.Point(x, y)
+         if self.world.within_bounds(pt):
+            frame[(x, y)] = snapshot_tile(self.world, pt)
+      with self.lock:
+         self.back.update(frame)
+   def take(self):
+      with self.lock:
+         frame = self.back
+         self.back = {}
+      return frame
+   def stop(self):
+      self.running = False
+      if self.is_alive():
+         self.join()
+
+
+def snapshot_occupant(entity, pt):
+   return Occupant(pt, entity.get_image(), entity.get_kind())
+
+
+def snapshot_tile(world, pt):
+   occupant = world.get_tile_occupant(pt)
+   if occupant:
+      occupant = snapshot_occupant(occupant, pt)
+   return (world.get_background(pt), occupant)
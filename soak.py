@@ -0,0 +1,177 @@
+import argparse
+import collections
+import headless
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+DEFAULT_HOURS = 8
+DEFAULT_INTERVAL = 600000
+DEFAULT_WARMUP = 3
+GROWTH_TOLERANCE = 0.1
+DECAY_TOLERANCE = 0.4
+MS_PER_HOUR = 3600000
+
+Sample = collections.namedtuple('Sample',
+   'ticks queue_depth entities pending_actions name_length rss_kb rate')
+
+# series checked for unbounded growth; rate is checked for decay instead
+GROWTH_COLUMNS = ['queue_depth', 'entities', 'pending_actions', 'name_length',
+   'rss_kb']
+
+
+def take_sample(world, ticks, rate):
+   pending = 0
+   name_length = 0
+   for entity in world.get_entities():
+      if hasattr(entity, 'get_pending_actions'):
+         pending += len(entity.get_pending_actions())
+      name_length = max(name_length, len(entity.get_name()))
+   return Sample(ticks, world.action_queue.size(), len(world.get_entities()),
+      pending, name_length, current_rss(), rate)
+
+
+def current_rss():
+   try:
+      with open('/proc/self/statm') as file:
+         resident = int(file.read().split()[1])
+      return resident * os.sysconf('SC_PAGE_SIZE') // 1024
+   except (OSError, ValueError):
+      # peak rather than current, but still never shrinks while leaking
+      return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Runs the world one interval at a time, timing each interval on the CPU
+# clock so that throughput is simulated milliseconds per CPU second.
+def soak(world, duration, interval):
+   clock = None
+   samples = []
+   ran = 0
+   while ran < duration:
+      step = min(interval, duration - ran)
+      start = time.process_time()
+      clock = headless.run(world, step, clock)
+      elapsed = time.process_time() - start
+      ran += step
+      samples.append(take_sample(world, clock.get_ticks(),
+         step / elapsed if elapsed > 0 else float('inf')))
+   return samples
+
+
+# Both checks compare the median of the last third of the measured samples
+# with that of the first third, so a leak still shows through the jitter of
+# normal play and a few slow intervals on a busy machine do not fail a run.
+# A series grows when it ends more than the tolerance above where it
+# started; throughput decays when it ends more than the decay tolerance
+# below.
+def find_problems(samples, warmup, tolerance=GROWTH_TOLERANCE,
+   decay_tolerance=DECAY_TOLERANCE):
+   measured = samples[warmup:]
+   if len(measured) < 3:
+      return ['too few samples after warmup: ' + str(len(measured))]
+
+   problems = []
+   for column in GROWTH_COLUMNS:
+      (first, last) = median_thirds([getattr(sample, column)
+         for sample in measured])
+      if last > first * (1 + tolerance):
+         problems.append('%s grew from a median of %g to %g' % (column,
+            first, last))
+
+   (first, last) = median_thirds([sample.rate for sample in measured])
+   if last < first * (1 - decay_tolerance):
+      problems.append('throughput fell from %.0f to %.0f simulated ms per '
+         'cpu second' % (first, last))
+   return problems
+
+
+def median_thirds(series):
+   third = len(series) // 3
+   return (statistics.median(series[:third]),
+      statistics.median(series[-third:]))
+
+
+def print_samples(samples, warmup):
+   print('%10s %8s %9s %8s %6s %10s %10s' % ('minutes', 'queue', 'entities',
+      'pending', 'name', 'rss kB', 'rate'))
+   for (index, sample) in enumerate(samples):
+      print('%10.0f %8d %9d %8d %6d %10d %10.0f%s' % (
+         sample.ticks / 60000.0, sample.queue_depth, sample.entities,
+         sample.pending_actions, sample.name_length, sample.rss_kb,
+         sample.rate, '  (warmup)' if index < warmup else ''))
+
+
+def write_report(filename, args, samples, problems):
+   with open(filename, 'w') as file:
+      json.dump({'world' : args.world,
+                 'seed' : args.seed,
+                 'hours' : args.hours,
+                 'interval' : args.interval,
+                 'warmup' : args.warmup,
+                 'columns' : list(Sample._fields),
+                 'samples' : [list(sample) for sample in samples],
+                 'problems' : problems,
+                 'passed' : not problems
+                 }, file, indent=1)
+
+
+def main():
+   parser = argparse.ArgumentParser(
+      description='Run a world for many simulated hours and check that '
+      'nothing grows without bound and throughput holds.')
+   parser.add_argument('world', nargs='?', default=headless.WORLD_FILE)
+   parser.add_argument('--hours', type=float, default=DEFAULT_HOURS,
+      help='simulated hours to run')
+   parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+      help='simulated milliseconds between samples')
+   parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+      help='leading samples left out of the checks')
+   parser.add_argument('--tolerance', type=float, default=GROWTH_TOLERANCE,
+      help='growth a series may show from the first third to the last')
+   parser.add_argument('--decay', type=float, default=DECAY_TOLERANCE,
+      help='fraction of throughput the end of the run may lose')
+   parser.add_argument('--seed', type=int, default=0)
+   parser.add_argument('--size', type=int, nargs=2,
+      metavar=('COLS', 'ROWS'),
+      default=(headless.WORLD_COLS, headless.WORLD_ROWS))
+   parser.add_argument('--batch-moves', action='store_true')
+   parser.add_argument('--pathfinding', action='store_true')
+   parser.add_argument('--distance-fields', action='store_true')
+   parser.add_argument('--lod', type=int, metavar='RADIUS')
+   parser.add_argument('--output', metavar='PATH',
+      help='also write the samples and verdict as JSON')
+   args = parser.parse_args()
+
+   random.seed(args.seed)
+   (world, i_store) = headless.create_world(args.world, args.size[0],
+      args.size[1])
+   if args.batch_moves:
+      world.enable_batched_movement()
+   if args.pathfinding:
+      world.enable_pathfinding()
+   if args.distance_fields:
+      world.enable_distance_fields()
+   if args.lod is not None:
+      world.enable_lod(args.lod)
+      world.lod.set_view((0, 0, headless.VIEW_COLS, headless.VIEW_ROWS), 0)
+
+   samples = soak(world, int(args.hours * MS_PER_HOUR), args.interval)
+   problems = find_problems(samples, args.warmup, args.tolerance, args.decay)
+   print_samples(samples, args.warmup)
+   if args.output:
+      write_report(args.output, args, samples, problems)
+
+   for problem in problems:
+      print('FAIL: ' + problem)
+   if problems:
+      sys.exit(1)
+   print('PASS: %d samples over %g simulated hours' % (len(samples),
+      args.hours))
+
+
+if __name__ == '__main__':
+   main()
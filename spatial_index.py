@@ -0,0 +1,206 @@
+import events
+import heapq
+import point
+
+CELL_SIZE = 8
+SCAN_LIMIT = 64
+
+
+# Buckets the entities of each class by square cell, following the world's
+# entity events.  Every entity also keeps the sequence number it was added
+# with, and k_nearest breaks distance ties on it, so it agrees with a scan
+# of world.entities in list order.  Nearest queries grow rings of cells out
+# from the query point, handing out each ring's results once no unvisited
+# cell can hold anything closer; with only a few candidates they simply
+# measure them all.  Every query is a generator so callers can stop early.
+# Free cells come nearest first (ties by row, then column) from within the
+# square of max_distance rings around the point.
+class SpatialIndex:
+   def __init__(self, world, cell_size=CELL_SIZE):
+      self.world = world
+      self.size = cell_size
+      self.cols = (world.num_cols + cell_size - 1) // cell_size
+      self.rows = (world.num_rows + cell_size - 1) // cell_size
+      self.rebuild()
+      world.events.subscribe(events.EntityAdded, self.entity_added)
+      world.events.subscribe(events.EntityMoved, self.entity_moved)
+      world.events.subscribe(events.EntityRemoved, self.entity_removed)
+   def rebuild(self):
+      self.cells = {}
+      self.counts = {}
+      self.type_grids = {}
+      self.order = {}
+      self.next_order = 0
+      for entity in self.world.get_entities():
+         self.add(entity, entity.get_position())
+   def add(self, entity, pt):
+      cls = type(entity)
+      cells = self.cells.get(cls)
+      if cells is None:
+         cells = self.cells[cls] = {}
+         self.counts[cls] = 0
+         self.type_grids.clear()
+      cells.setdefault(self.cell_of(pt), []).append(entity)
+      self.counts[cls] += 1
+      self.order[entity] = self.next_order
+      self.next_order += 1
+   def discard(self, entity, pt):
+      cls = type(entity)
+      key = self.cell_of(pt)
+      bucket = self.cells[cls][key]
+      bucket.remove(entity)
+      if not bucket:
+         del self.cells[cls][key]
+      self.counts[cls] -= 1
+   def entity_added(self, event):
+      self.add(event.entity, event.entity.get_position())
+   def entity_moved(self, event):
+      old_key = self.cell_of(event.old_pt)
+      new_key = self.cell_of(event.new_pt)
+      if old_key != new_key:
+         cells = self.cells[type(event.entity)]
+         bucket = cells[old_key]
+         bucket.remove(event.entity)
+         if not bucket:
+            del cells[old_key]
+         cells.setdefault(new_key, []).append(event.entity)
+   def entity_removed(self, event):
+      self.discard(event.entity, event.pt)
+      del self.order[event.entity]
+   def cell_of(self, pt):
+      return (pt.x // self.size, pt.y // self.size)
+   def grids(self, type):
+      grids = self.type_grids.get(type)
+      if grids is None:
+         grids = self.type_grids[type] = [cells for (cls, cells)
+            in self.cells.items() if issubclass(cls, type)]
+      return grids
+   def count(self, type):
+      return sum(self.counts[cls] for cls in self.counts
+         if issubclass(cls, type))
+   def k_nearest(self, pt, type, k=None):
+      grids = self.grids(type)
+      remaining = self.count(type)
+      if k is None or k > remaining:
+         k = remaining
+      if k <= 0:
+         return
+      if remaining <= SCAN_LIMIT:
+         found = []
+         for cells in grids:
+            for bucket in cells.values():
+               for entity in bucket:
+                  epos = entity.get_position()
+                  found.append(((pt.x - epos.x) ** 2 + (pt.y - epos.y) ** 2,
+                     self.order[entity], entity))
+         for (dist_sq, order, entity) in heapq.nsmallest(k, found):
+            yield entity
+         return
+
+      (cx, cy) = self.cell_of(pt)
+      last_ring = max(cx, cy, self.cols - 1 - cx, self.rows - 1 - cy)
+      found = []
+      for ring in range(0, last_ring + 1):
+         for key in square_ring(cx, cy, ring, self.cols, self.rows):
+            for cells in grids:
+               for entity in cells.get(key, ()):
+                  epos = entity.get_position()
+                  heapq.heappush(found, ((pt.x - epos.x) ** 2 +
+                     (pt.y - epos.y) ** 2, self.order[entity], entity))
+                  remaining -= 1
+
+         if remaining and ring < last_ring:
+            bound = min(pt.x - (cx - ring) * self.size + 1,
+               (cx + ring + 1) * self.size - pt.x,
+               pt.y - (cy - ring) * self.size + 1,
+               (cy + ring + 1) * self.size - pt.y)
+            bound_sq = bound * bound
+         else:
+            bound_sq = None
+         while found and (bound_sq is None or found[0][0] < bound_sq):
+            yield heapq.heappop(found)[2]
+            k -= 1
+            if not k:
+               return
+   def within_rect(self, left, top, right, bottom, type):
+      grids = self.grids(type)
+      for cy in range(max(top, 0) // self.size,
+         min(bottom, self.world.num_rows - 1) // self.size + 1):
+         for cx in range(max(left, 0) // self.size,
+            min(right, self.world.num_cols - 1) // self.size + 1):
+            for cells in grids:
+               for entity in cells.get((cx, cy), ()):
+                  epos = entity.get_position()
+                  if left <= epos.x <= right and top <= epos.y <= bottom:
+                     yield entity
+   def within_radius(self, pt, type, radius):
+      radius_sq = radius * radius
+      for entity in self.within_rect(pt.x - radius, pt.y - radius,
+         pt.x + radius, pt.y + radius, type):
+         epos = entity.get_position()
+         if (pt.x - epos.x) ** 2 + (pt.y - epos.y) ** 2 <= radius_sq:
+            yield entity
+   def free_cells(self, left, top, right, bottom):
+      occupancy = self.world.occupancy
+      left = max(left, 0)
+      right = min(right, self.world.num_cols - 1)
+      if left > right:
+         return
+      window = ((1 << (right - left + 1)) - 1) << left
+      for y in range(max(top, 0), min(bottom, self.world.num_rows - 1) + 1):
+         free = ~occupancy.occupied_rows[y] & window
+         while free:
+            low = free & -free
+            yield point.Point(low.bit_length() - 1, y)
+            free ^= low
+   def nearest_free_cell(self, pt, max_distance=None):
+      occupied_rows = self.world.occupancy.occupied_rows
+      (cols, rows) = (self.world.num_cols, self.world.num_rows)
+      (px, py) = (pt.x, pt.y)
+      last_ring = max(px, py, cols - 1 - px, rows - 1 - py)
+      if max_distance is not None:
+         last_ring = min(last_ring, max_distance)
+      if not occupied_rows[py] >> px & 1:
+         yield point.Point(px, py)
+      found = []
+      for ring in range(1, last_ring + 1):
+         # the ring's top and bottom rows a window of bits at a time, then
+         # the two columns between them
+         left = max(px - ring, 0)
+         window = ((1 << (min(px + ring, cols - 1) - left + 1)) - 1) << left
+         for y in (py - ring, py + ring):
+            if 0 <= y < rows:
+               free = ~occupied_rows[y] & window
+               while free:
+                  low = free & -free
+                  x = low.bit_length() - 1
+                  heapq.heappush(found, ((px - x) ** 2 + (py - y) ** 2, y, x))
+                  free ^= low
+         sides = [x for x in (px - ring, px + ring) if 0 <= x < cols]
+         for y in range(max(py - ring + 1, 0),
+            min(py + ring - 1, rows - 1) + 1):
+            row = occupied_rows[y]
+            for x in sides:
+               if not row >> x & 1:
+                  heapq.heappush(found, ((px - x) ** 2 + (py - y) ** 2, y, x))
+         bound_sq = (ring + 1) * (ring + 1)
+         while found and (ring == last_ring or found[0][0] < bound_sq):
+            (dist_sq, y, x) = heapq.heappop(found)
+            yield point.Point(x, y)
+
+def square_ring(cx, cy, ring, cols, rows):
+   if ring == 0:
+      if 0 <= cx < cols and 0 <= cy < rows:
+         yield (cx, cy)
+      return
+   left = max(cx - ring, 0)
+   right = min(cx + ring, cols - 1)
+   for y in (cy - ring, cy + ring):
+      if 0 <= y < rows:
+         for x in range(left, right + 1):
+            yield (x, y)
+   for x in (cx - ring, cx + ring):
+      if 0 <= x < cols:
+         for y in range(max(cy - ring + 1, 0),
+            min(cy + ring - 1, rows - 1) + 1):
+            yield (x, y)
@@ -0,0 +1,179 @@
+import asyncio
+import entities
+import json
+import os
+import point
+import queue
+import threading
+
+READ_CHUNK = 65536
+
+
+class TelemetryServer:
+   def __init__(self, path):
+      self.path = path
+      self.requests = queue.Queue()
+      self.loop = None
+      self.server = None
+      self.thread = None
+      self.ready = threading.Event()
+   def start(self):
+      if os.path.exists(self.path):
+         os.unlink(self.path)
+      self.thread = threading.Thread(target=self.run_loop, daemon=True)
+      self.thread.start()
+      self.ready.wait()
+   def stop(self):
+      if self.loop:
+         self.loop.call_soon_threadsafe(self.loop.stop)
+         self.thread.join()
+         self.loop = None
+      if os.path.exists(self.path):
+         os.unlink(self.path)
+   def run_loop(self):
+      loop = asyncio.new_event_loop()
+      asyncio.set_event_loop(loop)
+      self.server = loop.run_until_complete(
+         asyncio.start_unix_server(self.handle_client, path=self.path))
+      self.loop = loop
+      self.ready.set()
+      try:
+         loop.run_forever()
+      finally:
+         self.server.close()
+         loop.run_until_complete(self.server.wait_closed())
+         loop.close()
+   async def handle_client(self, reader, writer):
+      partial = b''
+      try:
+         while True:
+            chunk = await reader.read(READ_CHUNK)
+            if not chunk:
+               break
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            self.queue_batch(writer, lines)
+         # a last request may end at the end of input with no newline
+         self.queue_batch(writer, [partial])
+      finally:
+         # closed by the poll that answers everything queued before it
+         self.requests.put((writer, None))
+   def queue_batch(self, writer, lines):
+      batch = [line.decode('utf-8', 'replace') for line in lines
+         if line.strip()]
+      if batch:
+         # one queue entry per chunk so the replies go out together
+         self.requests.put((writer, batch))
+   def poll(self, world, clock):
+      while True:
+         try:
+            (writer, batch) = self.requests.get_nowait()
+         except queue.Empty:
+            return
+         if batch is None:
+            self.loop.call_soon_threadsafe(send_reply, writer, None)
+            continue
+         replies = [handle_request(world, clock, line) for line in batch]
+         payload = ''.join(json.dumps(reply) + '\n' for reply in replies)
+         self.loop.call_soon_threadsafe(send_reply, writer,
+            payload.encode('utf-8'))
+
+
+# no data marks the end of the client's requests; the transport sends
+# anything still buffered before it closes
+def send_reply(writer, data):
+   if writer.is_closing():
+      return
+   if data is None:
+      writer.close()
+   else:
+      writer.write(data)
+
+
+def start_server(path):
+   server = TelemetryServer(path)
+   server.start()
+   return server
+
+
+def handle_request(world, clock, line):
+   words = line.split()
+   handler = REQUEST_HANDLERS.get(words[0])
+   if not handler:
+      return {'error': 'unknown request: ' + words[0]}
+   try:
+      return handler(world, clock, words[1:])
+   except (ValueError, IndexError):
+      return {'error': 'bad arguments: ' + line.strip()}
+
+
+def entity_counts(world, clock, args):
+   counts = {}
+   for entity in world.get_entities():
+      kind = type(entity).__name__
+      counts[kind] = counts.get(kind, 0) + 1
+   return {'counts': counts}
+
+
+def queue_depth(world, clock, args):
+   return {'queue_depth': world.action_queue.size()}
+
+
+def occupancy_region(world, clock, args):
+   (left, top, width, height) = [int(arg) for arg in args[:4]]
+   rows = []
+   for y in range(top, top + height):
+      row = []
+      for x in range(left, left + width):
+         occupant = world.get_tile_occupant(point.Point(x, y))
+         row.append(type(occupant).__name__ if occupant else None)
+      rows.append(row)
+   return {'region': rows}
+
+
+def smith_resources(world, clock, args):
+   smiths = {}
+   for entity in world.get_entities():
+      if (isinstance(entity, entities.Blacksmith) and
+         (not args or entity.get_name() == args[0])):
+         smiths[entity.get_name()] = {
+            'resource_count': entity.get_resource_count(),
+            'resource_limit': entity.get_resource_limit()}
+   return {'smiths': smiths}
+
+
+def clock_status(world, clock, args):
+   return {'ticks': clock.get_ticks(), 'paused': clock.is_paused(),
+      'speed': clock.get_speed()}
+
+
+def pause(world, clock, args):
+   clock.pause()
+   return clock_status(world, clock, args)
+
+
+def resume(world, clock, args):
+   clock.resume()
+   return clock_status(world, clock, args)
+
+
+def step(world, clock, args):
+   clock.step(int(args[0]) if args else 1)
+   return clock_status(world, clock, args)
+
+
+def speed(world, clock, args):
+   clock.set_speed(float(args[0]))
+   return clock_status(world, clock, args)
+
+
+REQUEST_HANDLERS = {'counts' : entity_counts,
+                    'queue' : queue_depth,
+                    'region' : occupancy_region,
+                    'smith' : smith_resources,
+                    'status' : clock_status,
+                    'pause' : pause,
+                    'resume' : resume,
+                    'step' : step,
+                    'speed' : speed
+                    }
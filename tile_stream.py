@@ -0,0 +1,150 @@
+import os
+import point
+import socket
+import struct
+import zlib
+
+MAGIC = b'GTDS'
+VERSION = 1
+KEYFRAME_INTERVAL = 100
+NO_IMAGE = 0xFFFF
+READ_CHUNK = 65536
+SOCKET_PREFIX = 'unix:'
+
+KEYFRAME = b'K'
+DELTA = b'D'
+
+HEADER = struct.Struct('<4sHHHH')
+IMAGE_ENTRY = struct.Struct('<HH')
+FRAME = struct.Struct('<cII')
+TILE = struct.Struct('<HHHH')
+
+
+class TileStreamWriter:
+   def __init__(self, out, world, i_store,
+      keyframe_interval=KEYFRAME_INTERVAL):
+      self.out = out
+      self.world = world
+      self.keyframe_interval = keyframe_interval
+      self.frame_count = 0
+      self.compressor = zlib.compressobj()
+      (self.image_table, self.image_ids) = build_image_table(i_store)
+      self.write_header()
+   def write_header(self):
+      parts = [HEADER.pack(MAGIC, VERSION, self.world.num_cols,
+         self.world.num_rows, len(self.image_table))]
+      for (key, index) in self.image_table:
+         name = key.encode('utf-8')
+         parts.append(IMAGE_ENTRY.pack(len(name), index))
+         parts.append(name)
+      self.emit(b''.join(parts))
+   def write_frame(self, ticks, tiles):
+      if self.frame_count % self.keyframe_interval == 0:
+         self.write_keyframe(ticks)
+      else:
+         self.write_delta(ticks, tiles)
+      self.frame_count += 1
+   def write_keyframe(self, ticks):
+      records = []
+      for y in range(0, self.world.num_rows):
+         for x in range(0, self.world.num_cols):
+            records.append(self.pack_tile(x, y))
+      self.emit(FRAME.pack(KEYFRAME, ticks, len(records)) +
+         b''.join(records))
+   def write_delta(self, ticks, tiles):
+      seen = set()
+      records = []
+      for tile in tiles:
+         key = (tile.x, tile.y)
+         if key not in seen and self.world.within_bounds(tile):
+            seen.add(key)
+            records.append(self.pack_tile(tile.x, tile.y))
+      if records:
+         self.emit(FRAME.pack(DELTA, ticks, len(records)) +
+            b''.join(records))
+   def pack_tile(self, x, y):
+      pt = point.Point(x, y)
+      bgnd = self.image_ids.get(id(self.world.get_background_image(pt)),
+         NO_IMAGE)
+      occupant = self.world.get_tile_occupant(pt)
+      occ = (self.image_ids.get(id(occupant.get_image()), NO_IMAGE)
+         if occupant else NO_IMAGE)
+      return TILE.pack(x, y, bgnd, occ)
+   def emit(self, data):
+      self.out.write(self.compressor.compress(data) +
+         self.compressor.flush(zlib.Z_SYNC_FLUSH))
+      self.out.flush()
+   def close(self):
+      self.out.write(self.compressor.flush())
+      self.out.close()
+
+
+class TileStreamReader:
+   def __init__(self, inp):
+      self.inp = inp
+      self.decompressor = zlib.decompressobj()
+      self.buffer = b''
+      (magic, version, self.num_cols, self.num_rows, num_images) = \
+         HEADER.unpack(self.read_exact(HEADER.size))
+      if magic != MAGIC or version != VERSION:
+         raise ValueError('not a tile stream (version ' + str(version) + ')')
+      self.image_table = []
+      for i in range(0, num_images):
+         (length, index) = IMAGE_ENTRY.unpack(self.read_exact(IMAGE_ENTRY.size))
+         key = self.read_exact(length).decode('utf-8')
+         self.image_table.append((key, index))
+   def read_exact(self, size):
+      while len(self.buffer) < size:
+         chunk = self.inp.read1(READ_CHUNK)
+         if not chunk:
+            self.buffer += self.decompressor.flush()
+            if len(self.buffer) < size:
+               raise EOFError('truncated tile stream')
+            break
+         self.buffer += self.decompressor.decompress(chunk)
+      data = self.buffer[:size]
+      self.buffer = self.buffer[size:]
+      return data
+   def frames(self):
+      while True:
+         try:
+            (kind, ticks, count) = FRAME.unpack(self.read_exact(FRAME.size))
+         except EOFError:
+            return
+         data = self.read_exact(count * TILE.size)
+         yield (kind, ticks, list(TILE.iter_unpack(data)))
+
+
+def start_recording(target, world, i_store):
+   return TileStreamWriter(open_output(target), world, i_store)
+
+
+def build_image_table(i_store):
+   table = []
+   ids = {}
+   for key in sorted(i_store):
+      for (index, img) in enumerate(i_store[key]):
+         if id(img) not in ids:
+            ids[id(img)] = len(table)
+            table.append((key, index))
+   return (table, ids)
+
+
+def open_output(target):
+   if target.startswith(SOCKET_PREFIX):
+      sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      sock.connect(target[len(SOCKET_PREFIX):])
+      return sock.makefile('wb')
+   return open(target, 'wb')
+
+
+def open_input(source):
+   if source.startswith(SOCKET_PREFIX):
+      listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      listener.bind(source[len(SOCKET_PREFIX):])
+      listener.listen(1)
+      (conn, addr) = listener.accept()
+      listener.close()
+      os.unlink(source[len(SOCKET_PREFIX):])
+      return conn.makefile('rb')
+   return open(source, 'rb')
@@ -0,0 +1,74 @@
+import collections
+import json
+import os
+import threading
+import time
+
+TRACE_FILE = 'trace.json'
+DEFAULT_CAPACITY = 200000
+MAX_TRACED_TILES = 16
+
+PROCESS_ID = 1
+SIMULATION_THREAD = 1
+RENDER_THREAD = 2
+THREAD_NAMES = {SIMULATION_THREAD : 'simulation',
+                RENDER_THREAD : 'render'
+                }
+
+
+# Records trace events in the Chrome trace-event format, which Perfetto and
+# chrome://tracing open directly.  Slices and counters are stamped with
+# wall-clock microseconds since the tracer started; the simulation tick is
+# kept in each event's args.  Only the newest `capacity` events are kept,
+# so tracing can stay on for a long run and be written out when something
+# goes wrong.
+class Tracer:
+   def __init__(self, filename=TRACE_FILE, capacity=DEFAULT_CAPACITY):
+      self.filename = filename
+      self.events = collections.deque(maxlen=capacity)
+      self.recorded = 0
+      self.start = time.perf_counter()
+      self.lock = threading.Lock()
+   def now(self):
+      return (time.perf_counter() - self.start) * 1000000
+   def add(self, event):
+      self.events.append(event)
+      self.recorded += 1
+   def slice(self, name, category, start, args, tid=SIMULATION_THREAD):
+      self.add({'name' : name, 'cat' : category, 'ph' : 'X', 'ts' : start,
+         'dur' : self.now() - start, 'pid' : PROCESS_ID, 'tid' : tid,
+         'args' : args})
+   def counter(self, name, values, tid=SIMULATION_THREAD):
+      self.add({'name' : name, 'ph' : 'C', 'ts' : self.now(),
+         'pid' : PROCESS_ID, 'tid' : tid, 'args' : values})
+   def action(self, action, entity, ticks, start, tiles):
+      self.slice(action.kind, 'action', start,
+         {'entity' : entity.get_name(),
+          'scheduled' : action.time,
+          'actual' : ticks,
+          'late' : ticks - action.time,
+          'tile_count' : len(tiles),
+          'tiles' : [(pt.x, pt.y) for pt in tiles[:MAX_TRACED_TILES]]})
+   def tick(self, ticks, start, executed, queue_depth):
+      self.slice('update_on_time', 'tick', start,
+         {'ticks' : ticks, 'actions' : executed})
+      self.counter('queue depth', {'actions' : queue_depth})
+   def dropped(self):
+      return self.recorded - len(self.events)
+   def flush(self):
+      with self.lock:
+         events = [metadata('process_name', 0, 'world')]
+         events.extend(metadata('thread_name', tid, name)
+            for (tid, name) in sorted(THREAD_NAMES.items()))
+         events.extend(list(self.events))
+         tmp_name = self.filename + '.tmp'
+         with open(tmp_name, 'w') as file:
+            json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms',
+               'otherData' : {'dropped_events' : self.dropped()}}, file)
+         os.replace(tmp_name, self.filename)
+      return self.filename
+
+
+def metadata(name, tid, value):
+   return {'name' : name, 'ph' : 'M', 'pid' : PROCESS_ID, 'tid' : tid,
+      'args' : {'name' : value}}
@@ -1,11 +1,15 @@
 import entities
-import pygame
+import events
+import lod
+import math
+import movement
 import ordered_list
+import pathfinding
 import actions
+import distance_field
 import occ_grid
 import point
-import save_load
-import image_store
+import spatial_index
 
 PROPERTY_KEY = 0
 
@@ -15,14 +19,30 @@ BGND_NAME = 1
 BGND_COL = 2
 BGND_ROW = 3
 
+SLACK_EPSILON = 1e-9
+
 class WorldModel:
    def __init__(self, num_rows, num_cols, background):
-      self.background = occ_grid.Grid(num_cols, num_rows, background)
+      self.background = occ_grid.BackgroundGrid(num_cols, num_rows,
+         background)
       self.num_rows = num_rows
       self.num_cols = num_cols
-      self.occupancy = occ_grid.Grid(num_cols, num_rows, None)
+      self.occupancy = occ_grid.OccupancyGrid(num_cols, num_rows)
       self.entities = []
       self.action_queue = ordered_list.OrderedList()
+      self.events = events.EventBus()
+      self.movement = None
+      self.pathfinder = None
+      self.distance_fields = None
+      self.lod = None
+      self.tracer = None
+      self.i_store = None
+      self.entity_ids = {}
+      self.next_entity_id = 1
+      self.vein_targets = {}
+      self.index = spatial_index.SpatialIndex(self)
+      self.events.subscribe(events.EntityAdded, self.track_added_vein)
+      self.events.subscribe(events.EntityRemoved, self.track_removed_vein)
       
    def within_bounds(self, pt):
       return (pt.x >= 0 and pt.x < self.num_cols and
@@ -30,10 +50,37 @@ class WorldModel:
    def is_occupied(self, pt):
       return (self.within_bounds(pt) and
          self.occupancy.get_cell(pt) != None)
+   # Ore spawns on the free cell nearest the vein within `distance` rings,
+   # ties going to the upper row and then the left column.
+   def find_open_around(self, pt, distance):
+      return next(self.index.nearest_free_cell(pt, distance), None)
    def find_nearest(self, pt, type):
-      oftype = [(e, distance_sq(pt, e.get_position()))
-         for e in self.entities if isinstance(e, type)]
-      return nearest_entity(oftype)
+      return next(self.index.k_nearest(pt, type, 1), None)
+   def find_target(self, pt, type):
+      if self.distance_fields:
+         target = self.distance_fields.adjacent_target(pt, type)
+         if target:
+            return target
+      return self.find_nearest(pt, type)
+   def k_nearest(self, pt, type, k=None):
+      return self.index.k_nearest(pt, type, k)
+   def within_radius(self, pt, type, radius):
+      return self.index.within_radius(pt, type, radius)
+   def within_rect(self, left, top, right, bottom, type):
+      return self.index.within_rect(left, top, right, bottom, type)
+   def free_cells(self, left, top, right, bottom):
+      return self.index.free_cells(left, top, right, bottom)
+   def nearest_free_cell(self, pt, max_distance=None):
+      return self.index.nearest_free_cell(pt, max_distance)
+   def find_nearest_vein(self, entity):
+      pt = entity.get_position()
+      target = self.vein_targets.get(entity)
+      if target and target_still_nearest(pt, target):
+         return target[0]
+
+      target = nearest_with_slack(pt, self.k_nearest(pt, entities.Vein, 2))
+      self.vein_targets[entity] = target
+      return target[0]
    def add_entity(self, entity):
       pt = entity.get_position()
       if self.within_bounds(pt):
@@ -42,7 +89,24 @@ class WorldModel:
             old_entity.clear_pending_actions()
          self.occupancy.set_cell(pt, entity)
          self.entities.append(entity)
+         if self.events.wants(events.EntityAdded):
+            self.events.publish(events.EntityAdded(entity))
+   def enable_batched_movement(self):
+      self.movement = movement.MovementPhase(self)
+   def enable_pathfinding(self):
+      self.pathfinder = pathfinding.Pathfinder(self)
+   def enable_distance_fields(self):
+      self.distance_fields = distance_field.DistanceFields(self)
+   def enable_tracing(self, tracer):
+      self.tracer = tracer
+   def enable_lod(self, radius=None, steps=None):
+      self.lod = lod.DetailRegion(self,
+         lod.LOD_RADIUS if radius is None else radius,
+         lod.LOD_STEPS if steps is None else steps)
    def move_entity(self, entity, pt):
+      if self.movement:
+         return self.movement.request(entity, pt)
+
       tiles = []
       if self.within_bounds(pt):
          old_pt = entity.get_position()
@@ -51,7 +115,30 @@ class WorldModel:
          self.occupancy.set_cell(pt, entity)
          tiles.append(pt)
          entity.set_position(pt)
+         if self.events.wants(events.EntityMoved):
+            self.events.publish(events.EntityMoved(entity, old_pt, pt))
+      return tiles
+   def apply_moves(self, moves):
+      tiles = []
+      old_pts = []
+      for entity in moves:
+         old_pt = entity.get_position()
+         self.occupancy.set_cell(old_pt, None)
+         tiles.append(old_pt)
+         old_pts.append(old_pt)
+      for (entity, old_pt) in zip(moves, old_pts):
+         pt = moves[entity]
+         self.occupancy.set_cell(pt, entity)
+         tiles.append(pt)
+         entity.set_position(pt)
+         if self.events.wants(events.EntityMoved):
+            self.events.publish(events.EntityMoved(entity, old_pt, pt))
       return tiles
+   def transform_entity(self, old_entity, new_entity):
+      self.remove_entity_at(old_entity.get_position())
+      self.add_entity(new_entity)
+      if self.events.wants(events.EntityTransformed):
+         self.events.publish(events.EntityTransformed(old_entity, new_entity))
    def remove_entity(self, entity):
       self.remove_entity_at(entity.get_position())
    def remove_entity_at(self, pt):
@@ -60,7 +147,18 @@ class WorldModel:
          entity = self.occupancy.get_cell(pt)
          entity.set_position(point.Point(-1, -1))
          self.entities.remove(entity)
+         self.entity_ids.pop(getattr(entity, 'id', None), None)
          self.occupancy.set_cell(pt, None)
+         if self.events.wants(events.EntityRemoved):
+            self.events.publish(events.EntityRemoved(entity, pt))
+   def track_added_vein(self, event):
+      if isinstance(event.entity, entities.Vein):
+         self.vein_targets.clear()
+   def track_removed_vein(self, event):
+      if isinstance(event.entity, entities.Vein):
+         self.vein_targets.clear()
+      else:
+         self.vein_targets.pop(event.entity, None)
    def schedule_action(self, action, time):
       self.action_queue.insert(action, time)
    def unschedule_action(self, action):
@@ -68,12 +166,36 @@ class WorldModel:
    def update_on_time(self, ticks):
       tiles = []
 
+      tracer = self.tracer
+      if tracer:
+         tick_start = tracer.now()
+         executed = 0
+
+      handlers = entities.ACTION_HANDLERS
       next = self.action_queue.head()
       while next and next.ord < ticks:
          self.action_queue.pop()
-         tiles.extend(next.item(ticks))  # invoke action function
+         action = next.item
+         entity = self.entity_ids.get(action.entity_id)
+         if entity:
+            entity.remove_pending_action(action)
+            if tracer:
+               start = tracer.now()
+               touched = handlers[action.kind](entity, self, ticks,
+                  *action.args)
+               tracer.action(action, entity, ticks, start, touched)
+               tiles.extend(touched)
+               executed += 1
+            else:
+               tiles.extend(handlers[action.kind](entity, self, ticks,
+                  *action.args))
          next = self.action_queue.head()
 
+      if self.movement:
+         tiles.extend(self.movement.resolve())
+      self.events.flush()
+      if tracer:
+         tracer.tick(ticks, tick_start, executed, self.action_queue.size())
       return tiles
    def get_background_image(self, pt):
       if self.within_bounds(pt):
@@ -84,12 +206,30 @@ class WorldModel:
          return self.background.get_cell(pt)
    def set_background(self, pt, bgnd):
       if self.within_bounds(pt):
-         self.background.set_cell(pt, bgnd)
+         if self.events.wants(events.BackgroundChanged):
+            old_bgnd = self.background.get_cell(pt)
+            self.background.set_cell(pt, bgnd)
+            self.events.publish(events.BackgroundChanged(pt, old_bgnd,
+               self.background.get_cell(pt)))
+         else:
+            self.background.set_cell(pt, bgnd)
+   def get_background_kind(self, name, imgs):
+      index = self.background.find(name, imgs)
+      if index is None:
+         index = self.background.intern(entities.Background(name, imgs))
+      return self.background.palette[index]
    def get_tile_occupant(self, pt):
       if self.within_bounds(pt):
          return self.occupancy.get_cell(pt)
    def get_entities(self):
       return self.entities
+   def get_entity(self, entity_id):
+      return self.entity_ids.get(entity_id)
+   def register_entity(self, entity):
+      entity.id = self.next_entity_id
+      self.next_entity_id += 1
+      self.entity_ids[entity.id] = entity
+      return entity.id
 
 
    def schedule_entity(self, entity, i_store):
@@ -102,20 +242,37 @@ class WorldModel:
 
 #these functions help above methods
 
-def nearest_entity(entity_dists):
-   if len(entity_dists) > 0:
-      pair = entity_dists[0]
-      for other in entity_dists:
-         if other[1] < pair[1]:
-            pair = other
-      nearest = pair[0]
+def distance_sq(p1, p2):
+   return (p1.x - p2.x)**2 + (p1.y - p2.y)**2
+
+
+# Finds the first of the candidates at the least distance, and also how far
+# pt may move before another candidate could become at least as close: each
+# step of d moves the nearest distance up and the runner-up down by at most d.
+def nearest_with_slack(pt, candidates):
+   nearest = None
+   best = None
+   second = None
+   for entity in candidates:
+      dist = distance_sq(pt, entity.get_position())
+      if best is None or dist < best:
+         second = best
+         (nearest, best) = (entity, dist)
+      elif second is None or dist < second:
+         second = dist
+
+   if second is None:
+      slack_sq = float('inf')
    else:
-      nearest = None
+      slack = (math.sqrt(second) - math.sqrt(best)) / 2 - SLACK_EPSILON
+      slack_sq = slack * slack if slack > 0 else 0
 
-   return nearest
+   return (nearest, point.Point(pt.x, pt.y), slack_sq)
 
 
-def distance_sq(p1, p2):
-   return (p1.x - p2.x)**2 + (p1.y - p2.y)**2
+def target_still_nearest(pt, target):
+   (nearest, origin, slack_sq) = target
+   moved_sq = distance_sq(pt, origin)
+   return moved_sq == 0 or moved_sq < slack_sq
 
 
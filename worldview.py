@@ -1,15 +1,24 @@
+import collections
+import events
+import minimap
 import pygame
 import worldmodel
 import entities
 import point
+import tracing
 
 MOUSE_HOVER_ALPHA = 120
 MOUSE_HOVER_EMPTY_COLOR = (0, 255, 0)
 MOUSE_HOVER_OCC_COLOR = (255, 0, 0)
+OUTSIDE_WORLD_COLOR = (0, 0, 0)
+
+CHUNK_TILES = 16
+CHUNK_CACHE_PIXELS = 1 << 24
+MAX_ZOOM = 3
 
 class WorldView:
    def __init__(self, view_cols, view_rows, screen, world, tile_width,
-      tile_height, mouse_img=None):
+      tile_height, mouse_img=None, mipmaps=None):
       self.viewport = pygame.Rect(0, 0, view_cols, view_rows)
       self.screen = screen
       self.mouse_pt = point.Point(0, 0)
@@ -19,66 +28,211 @@ class WorldView:
       self.num_rows = world.num_rows
       self.num_cols = world.num_cols
       self.mouse_img = mouse_img
-   def draw_background(self):
-      for y in range(0, self.viewport.height):
-         for x in range(0, self.viewport.width):
-            w_pt = viewport_to_world(self.viewport, point.Point(x, y))
-            img = self.world.get_background_image(w_pt)
-            self.screen.blit(img, (x * self.tile_width, y * self.tile_height))
-   def draw_entities(self):
-      for entity in self.world.entities:
-         if self.viewport.collidepoint(entity.position.x, entity.position.y):
-            v_pt = world_to_viewport(self.viewport, entity.position)
-            self.screen.blit(entity.get_image(),
-               (v_pt.x * self.tile_width, v_pt.y * self.tile_height))
+      self.view_cols = view_cols
+      self.view_rows = view_rows
+      self.mipmaps = mipmaps or [{}]
+      self.chunks = [collections.OrderedDict() for level in self.mipmaps]
+      self.zoom = 0
+      self.zoom_tile_width = tile_width
+      self.zoom_tile_height = tile_height
+      self.minimap = None
+      self.dirty_tiles = set()
+      self.minimap_dirty = False
+      self.tracer = None
+      world.events.subscribe(events.BackgroundChanged,
+         self.background_changed)
+   def enable_tracing(self, tracer):
+      self.tracer = tracer
+   def enable_minimap(self):
+      (width, height) = self.screen.get_size()
+      self.minimap = minimap.Minimap(self.world, width, height)
+   def background_blits(self):
+      left = self.viewport.left // CHUNK_TILES
+      top = self.viewport.top // CHUNK_TILES
+      right = (self.viewport.right - 1) // CHUNK_TILES
+      bottom = (self.viewport.bottom - 1) // CHUNK_TILES
+      return [(self.get_chunk(chunk_x, chunk_y),
+         ((chunk_x * CHUNK_TILES - self.viewport.left) * self.zoom_tile_width,
+         (chunk_y * CHUNK_TILES - self.viewport.top) * self.zoom_tile_height))
+         for chunk_y in range(top, bottom + 1)
+         for chunk_x in range(left, right + 1)]
+   def entity_blits(self):
+      return [(self.scaled_image(entity.get_image()),
+         self.tile_dest(entity.position)) for entity in self.world.entities
+         if self.viewport.collidepoint(entity.position.x, entity.position.y)]
+   def tile_blits(self, tiles):
+      blits = []
+      for (x, y) in tiles:
+         pt = point.Point(x, y)
+         dest = self.tile_dest(pt)
+         blits.append((self.scaled_image(self.world.get_background_image(pt)),
+            dest))
+         occupant = self.world.get_tile_occupant(pt)
+         if occupant:
+            blits.append((self.scaled_image(occupant.get_image()), dest))
+      return blits
+   def tile_dest(self, pt):
+      return ((pt.x - self.viewport.left) * self.zoom_tile_width,
+         (pt.y - self.viewport.top) * self.zoom_tile_height)
    def draw_viewport(self):
-      self.draw_background()
-      self.draw_entities()
+      if self.tracer:
+         start = self.tracer.now()
+      if (self.viewport.width < self.view_cols << self.zoom or
+         self.viewport.height < self.view_rows << self.zoom):
+         self.screen.fill(OUTSIDE_WORLD_COLOR)
+      self.screen.blits(self.background_blits() + self.entity_blits(), False)
+      if self.minimap:
+         self.minimap.draw(self.screen, self.viewport)
+      if self.tracer:
+         self.tracer.slice('draw_viewport', 'render', start,
+            {'viewport' : tuple(self.viewport), 'zoom' : self.zoom},
+            tracing.RENDER_THREAD)
    def update_view(self, view_delta=(0,0), mouse_img=None):
-      self.viewport = create_shifted_viewport(self.viewport, view_delta,
+      scale = 1 << self.zoom
+      self.viewport = create_shifted_viewport(self.viewport,
+         (view_delta[0] * scale, view_delta[1] * scale),
          self.num_rows, self.num_cols)
       self.mouse_img = mouse_img
       self.draw_viewport()
+      self.dirty_tiles.clear()
+      self.minimap_dirty = False
       pygame.display.update()
       self.mouse_move(self.mouse_pt)
+      self.flush()
+   def set_zoom(self, zoom, mouse_img=None):
+      zoom = clamp(zoom, 0, len(self.mipmaps) - 1)
+      center_x = self.viewport.left + self.viewport.width // 2
+      center_y = self.viewport.top + self.viewport.height // 2
+
+      self.zoom = zoom
+      self.zoom_tile_width = max(self.tile_width >> zoom, 1)
+      self.zoom_tile_height = max(self.tile_height >> zoom, 1)
+      width = min(self.view_cols << zoom, self.num_cols)
+      height = min(self.view_rows << zoom, self.num_rows)
+      self.viewport = create_shifted_viewport(
+         pygame.Rect(center_x - width // 2, center_y - height // 2,
+            width, height), (0, 0), self.num_rows, self.num_cols)
+      self.mouse_pt = point.Point(0, 0)
+      self.update_view((0, 0), mouse_img)
+   def center_on(self, pt, mouse_img=None):
+      self.viewport = create_shifted_viewport(
+         self.viewport.move(pt.x - self.viewport.centerx,
+            pt.y - self.viewport.centery), (0, 0),
+         self.num_rows, self.num_cols)
+      self.update_view((0, 0), mouse_img)
+   def minimap_tile_at(self, pos):
+      if self.minimap:
+         return self.minimap.tile_at(pos)
    def update_view_tiles(self, tiles):
-      rects = []
+      self.mark_tiles(tiles)
+      self.flush()
+   def mark_tiles(self, tiles):
+      seen = set()
       for tile in tiles:
+         key = (tile.x, tile.y)
+         if key in seen:
+            continue
+         seen.add(key)
          if self.viewport.collidepoint(tile.x, tile.y):
-            v_pt = world_to_viewport(self.viewport, tile)
-            img = self.get_tile_image(v_pt)
-            rects.append(self.update_tile(v_pt, img))
-            if self.mouse_pt.x == v_pt.x and self.mouse_pt.y == v_pt.y:
-               rects.append(self.update_mouse_cursor())
+            self.dirty_tiles.add(key)
+         if self.minimap and self.world.within_bounds(tile):
+            self.minimap.update_tile(tile)
+            self.minimap_dirty = True
+   def flush(self):
+      if not self.dirty_tiles and not self.minimap_dirty:
+         return
+      if self.tracer:
+         start = self.tracer.now()
 
+      tiles = [(x, y) for (x, y) in self.dirty_tiles
+         if self.viewport.collidepoint(x, y)]
+      blits = self.tile_blits(tiles)
+      mouse = viewport_to_world(self.viewport, self.mouse_pt)
+      if (mouse.x, mouse.y) in self.dirty_tiles:
+         blits.append((self.create_mouse_surface(self.world.is_occupied(mouse)),
+            self.tile_dest(mouse)))
+      self.screen.blits(blits, False)
+
+      view_tiles = [(x - self.viewport.left, y - self.viewport.top)
+         for (x, y) in tiles]
+      rects = [pygame.Rect(x * self.zoom_tile_width, y * self.zoom_tile_height,
+         width * self.zoom_tile_width, height * self.zoom_tile_height)
+         for (x, y, width, height) in merge_tiles(view_tiles)]
+      if self.minimap and (self.minimap_dirty or
+         self.minimap.rect.collidelist(rects) != -1):
+         rects.append(self.minimap.draw(self.screen, self.viewport))
+
+      self.dirty_tiles.clear()
+      self.minimap_dirty = False
       pygame.display.update(rects)
+      if self.tracer:
+         self.tracer.slice('flush', 'render', start,
+            {'tiles' : len(tiles), 'rects' : len(rects)},
+            tracing.RENDER_THREAD)
    def update_tile(self, view_tile_pt, surface):
-      abs_x = view_tile_pt.x * self.tile_width
-      abs_y = view_tile_pt.y * self.tile_height
+      abs_x = view_tile_pt.x * self.zoom_tile_width
+      abs_y = view_tile_pt.y * self.zoom_tile_height
 
       self.screen.blit(surface, (abs_x, abs_y))
 
-      return pygame.Rect(abs_x, abs_y, self.tile_width, self.tile_height)
-   def get_tile_image(self, view_tile_pt):
-      pt = viewport_to_world(self.viewport, view_tile_pt)
-      bgnd = self.world.get_background_image(pt)
-      occupant = self.world.get_tile_occupant(pt)
-      if occupant:
-         img = pygame.Surface((self.tile_width, self.tile_height))
-         img.blit(bgnd, (0, 0))
-         img.blit(occupant.get_image(), (0,0))
+      return pygame.Rect(abs_x, abs_y, self.zoom_tile_width,
+         self.zoom_tile_height)
+   def scaled_image(self, img):
+      scaled = self.mipmaps[self.zoom].get(id(img))
+      if scaled:
+         return scaled
+      elif self.zoom == 0:
          return img
       else:
-         return bgnd
+         return pygame.transform.scale(img,
+            (self.zoom_tile_width, self.zoom_tile_height))
+   def get_chunk(self, chunk_x, chunk_y):
+      cache = self.chunks[self.zoom]
+      key = (chunk_x, chunk_y)
+      surface = cache.get(key)
+      if surface:
+         cache.move_to_end(key)
+         return surface
+
+      surface = pygame.Surface((CHUNK_TILES * self.zoom_tile_width,
+         CHUNK_TILES * self.zoom_tile_height))
+      surface.fill(OUTSIDE_WORLD_COLOR)
+      blits = []
+      for y in range(0, CHUNK_TILES):
+         for x in range(0, CHUNK_TILES):
+            bgnd = self.world.get_background(point.Point(
+               chunk_x * CHUNK_TILES + x, chunk_y * CHUNK_TILES + y))
+            if bgnd:
+               blits.append((self.scaled_image(bgnd.get_image()),
+                  (x * self.zoom_tile_width, y * self.zoom_tile_height)))
+      surface.blits(blits, False)
+
+      cache[key] = surface
+      if len(cache) > CHUNK_CACHE_PIXELS // surface.get_size()[0] // \
+         surface.get_size()[1]:
+         cache.popitem(last=False)
+      return surface
+   def background_changed(self, event):
+      pt = event.pt
+      key = (pt.x // CHUNK_TILES, pt.y // CHUNK_TILES)
+      x = pt.x % CHUNK_TILES
+      y = pt.y % CHUNK_TILES
+      img = event.new_background.get_image()
+      for (level, cache) in enumerate(self.chunks):
+         surface = cache.get(key)
+         if surface:
+            scaled = self.mipmaps[level].get(id(img), img)
+            (width, height) = scaled.get_size()
+            surface.blit(scaled, (x * width, y * height))
    def create_mouse_surface(self, occupied):
-      surface = pygame.Surface((self.tile_width, self.tile_height))
+      surface = pygame.Surface((self.zoom_tile_width, self.zoom_tile_height))
       surface.set_alpha(MOUSE_HOVER_ALPHA)
       color = MOUSE_HOVER_EMPTY_COLOR
       if occupied:
          color = MOUSE_HOVER_OCC_COLOR
       surface.fill(color)
       if self.mouse_img:
-         surface.blit(self.mouse_img, (0, 0))
+         surface.blit(self.scaled_image(self.mouse_img), (0, 0))
 
       return surface
    def update_mouse_cursor(self):
@@ -86,18 +240,15 @@ class WorldView:
          self.create_mouse_surface(
             self.world.is_occupied(viewport_to_world(self.viewport, self.mouse_pt))))
    def mouse_move(self, new_mouse_pt):
-      rects = []
-
-      rects.append(self.update_tile(self.mouse_pt,
-         self.get_tile_image(self.mouse_pt)))
+      old = viewport_to_world(self.viewport, self.mouse_pt)
+      self.dirty_tiles.add((old.x, old.y))
 
       if self.viewport.collidepoint(new_mouse_pt.x + self.viewport.left,
          new_mouse_pt.y + self.viewport.top):
          self.mouse_pt = new_mouse_pt
 
-      rects.append(self.update_mouse_cursor())
-
-      pygame.display.update(rects)
+      new = viewport_to_world(self.viewport, self.mouse_pt)
+      self.dirty_tiles.add((new.x, new.y))
 
 
 #helper functions for above class
@@ -120,3 +271,23 @@ def create_shifted_viewport(viewport, delta, num_rows, num_cols):
 
    return pygame.Rect(new_x, new_y, viewport.width, viewport.height)
 
+
+def merge_tiles(tiles):
+   runs = []
+   for (x, y) in sorted(tiles, key=lambda tile: (tile[1], tile[0])):
+      if runs and runs[-1][1] == y and runs[-1][0] + runs[-1][2] == x:
+         runs[-1][2] += 1
+      else:
+         runs.append([x, y, 1, 1])
+
+   rects = []
+   columns = {}
+   for (x, y, width, height) in runs:
+      rect = columns.get((x, width))
+      if rect and rect[1] + rect[3] == y:
+         rect[3] += 1
+      else:
+         rect = [x, y, width, height]
+         columns[(x, width)] = rect
+         rects.append(rect)
+   return rects